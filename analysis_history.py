@@ -0,0 +1,191 @@
+"""
+Analysis History - persistent, searchable record of past analyses
+Every completed analysis is stored in a local SQLite database with its
+model, parameters, input hash and timings; an FTS5 index over titles,
+inputs and reports makes past results searchable without re-running
+the model
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+DEFAULT_DB_PATH = Path(os.environ.get("QWEN_HISTORY_DB", Path(__file__).resolve().parent / "qwen_history.sqlite3"))
+PAGE_SIZE = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    app TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    model TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    input_hash TEXT NOT NULL,
+    title TEXT NOT NULL,
+    input_text TEXT NOT NULL DEFAULT '',
+    result TEXT NOT NULL,
+    timings TEXT NOT NULL DEFAULT '{}',
+    duration_s REAL
+);
+CREATE INDEX IF NOT EXISTS analyses_app_created ON analyses (app, created_at DESC);
+CREATE INDEX IF NOT EXISTS analyses_input_hash ON analyses (input_hash);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(
+    title, input_text, result,
+    content='analyses', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS analyses_ai AFTER INSERT ON analyses BEGIN
+    INSERT INTO analyses_fts (rowid, title, input_text, result)
+    VALUES (new.id, new.title, new.input_text, new.result);
+END;
+CREATE TRIGGER IF NOT EXISTS analyses_ad AFTER DELETE ON analyses BEGIN
+    INSERT INTO analyses_fts (analyses_fts, rowid, title, input_text, result)
+    VALUES ('delete', old.id, old.title, old.input_text, old.result);
+END;
+"""
+
+# Columns needed to list entries; input_text and result are only read on demand
+_SUMMARY_COLUMNS = "a.id, a.app, a.created_at, a.model, a.params, a.input_hash, a.title, a.duration_s"
+
+
+@dataclass
+class HistoryEntry:
+    id: int
+    app: str
+    created_at: float
+    model: str
+    params: Dict
+    input_hash: str
+    title: str
+    duration_s: Optional[float] = None
+    snippet: str = ""
+    input_text: Optional[str] = None
+    result: Optional[str] = None
+    timings: Dict = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created_at))
+        return f"{when} · {self.model} · {self.title}"
+
+
+def input_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    words = re.findall(r"\w+", text, flags=re.UNICODE)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class AnalysisHistory:
+    """
+    SQLite-backed store shared by all sessions of an app.
+
+    One connection is shared across Streamlit's script threads and
+    serialized with a lock; WAL mode keeps readers in other processes
+    (e.g. the second app) from blocking on writes.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, app: str, model: str, input_text: str, result: str, title: str,
+               params: Optional[Dict] = None, timings: Optional[Dict] = None,
+               duration_s: Optional[float] = None) -> int:
+        """Store a completed analysis and return its id"""
+        row = (
+            app, time.time(), model, json.dumps(params or {}, sort_keys=True, default=str),
+            input_hash(input_text), title, input_text, result,
+            json.dumps(timings or {}, default=str), duration_s,
+        )
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO analyses (app, created_at, model, params, input_hash, title, input_text, result, "
+                "timings, duration_s) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            return cursor.lastrowid
+
+    def _where(self, app: Optional[str], query: str) -> tuple:
+        clauses, args = [], []
+        match = fts_query(query) if query else ""
+        if match:
+            clauses.append("analyses_fts MATCH ?")
+            args.append(match)
+        if app:
+            clauses.append("a.app = ?")
+            args.append(app)
+        joins = "JOIN analyses_fts ON analyses_fts.rowid = a.id" if match else ""
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return joins, where, args, bool(match)
+
+    def search(self, query: str = "", app: Optional[str] = None, limit: int = PAGE_SIZE,
+               offset: int = 0) -> List[HistoryEntry]:
+        """
+        One page of entries, newest first (best match first when searching).
+
+        Only summary columns are read; call get() for the full report.
+        """
+        joins, where, args, matching = self._where(app, query)
+        snippet = "snippet(analyses_fts, -1, '**', '**', '…', 12)" if matching else "''"
+        order = "bm25(analyses_fts), a.created_at DESC" if matching else "a.created_at DESC"
+        sql = f"SELECT {_SUMMARY_COLUMNS}, {snippet} AS snippet FROM analyses a {joins} {where} " \
+              f"ORDER BY {order} LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(sql, args + [limit, offset]).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def count(self, query: str = "", app: Optional[str] = None) -> int:
+        joins, where, args, _ = self._where(app, query)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM analyses a {joins} {where}", args).fetchone()[0]
+
+    def get(self, entry_id: int) -> Optional[HistoryEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_SUMMARY_COLUMNS}, a.input_text, a.result, a.timings FROM analyses a WHERE a.id = ?",
+                (entry_id,),
+            ).fetchone()
+        return self._entry(row) if row else None
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> HistoryEntry:
+        keys = row.keys()
+        return HistoryEntry(
+            id=row["id"],
+            app=row["app"],
+            created_at=row["created_at"],
+            model=row["model"],
+            params=json.loads(row["params"]),
+            input_hash=row["input_hash"],
+            title=row["title"],
+            duration_s=row["duration_s"],
+            snippet=row["snippet"] if "snippet" in keys else "",
+            input_text=row["input_text"] if "input_text" in keys else None,
+            result=row["result"] if "result" in keys else None,
+            timings=json.loads(row["timings"]) if "timings" in keys else {},
+        )
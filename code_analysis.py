@@ -0,0 +1,244 @@
+"""
+Code Analysis - Qwen-powered review of Python code, independent of the UI
+Shared by the Streamlit debugger (qwen_debugger_final.py) and the headless
+batch runner (qwen_debugger_batch.py)
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+
+from dashscope_client import chat_completion, INTERACTIVE
+from tracing import propagate, span
+from code_chunker import (
+    CodeChunk, DEFAULT_MAX_CHUNK_LINES, split_code_into_chunks, merge_chunk_reports, chunk_hash, group_units,
+    combine_units,
+)
+from static_checks import Finding, run_static_checks, findings_in_range, format_findings
+
+# Files longer than this are split into chunks when chunked mode is on
+CHUNKING_THRESHOLD_LINES = 200
+CHUNK_MAX_TOKENS = 1500
+
+def call_qwen(messages: list, api_key: str, model: str, max_tokens: int = 3000, timeout: int = 90,
+              priority: int = INTERACTIVE) -> str:
+    """Send a chat request to Model Studio through the shared rate limiter (reply or ❌ error string)"""
+    return chat_completion(
+        messages, api_key, model, max_tokens=max_tokens, timeout=timeout, priority=priority,
+        user_agent="Qwen-Code-Debugger/1.0"
+    )
+
+def _static_check_findings(code: str, findings: Optional[List[Finding]]) -> List[Finding]:
+    if findings is not None:
+        return findings
+    with span("static_checks") as checks_span:
+        findings = run_static_checks(code)
+        checks_span.set(findings=len(findings))
+    return findings
+
+def _review_instructions(findings: List[Finding]) -> str:
+    """Static check results plus the problem/explanation steps, which shrink once detection is done locally"""
+    if not findings:
+        return """1. **Problems Identified**: List all issues (circular imports, inefficiency, bad practices)
+2. **Explanations**: Clearly explain each issue"""
+    return f"""Static analysis (heuristic AST rules) flagged these candidates - verify each one against the code:
+{format_findings(findings)}
+
+1. **Problems Identified**: Which flagged candidates are real (fix them in the refactored code) and which
+   are false positives (one line each on why), plus problems the static checks missed (logic errors,
+   inefficiency, bad practices), with line numbers
+2. **Explanations**: Briefly explain the confirmed and additional problems"""
+
+def analyze_code(code: str, api_key: str, model: str = "qwen-turbo", priority: int = INTERACTIVE,
+                 findings: Optional[List[Finding]] = None) -> str:
+    """
+    Analyze code using Model Studio API (international, non-streaming)
+
+    Static check findings (computed here if not given) go into the prompt
+    so the model concentrates on refactoring rather than detection.
+    """
+    findings = _static_check_findings(code, findings)
+    with span("prompt.build", code_lines=len(code.splitlines())) as prompt_span:
+        messages = _build_code_messages(code, findings)
+        prompt_span.set(prompt_chars=sum(len(m["content"]) for m in messages))
+
+    return call_qwen(messages, api_key, model, priority=priority)
+
+def _build_code_messages(code: str, findings: List[Finding]) -> list:
+    prompt = f"""You are an expert Python developer and code reviewer.
+Analyze the following code and provide:
+
+{_review_instructions(findings)}
+3. **Refactored Code**: Provide clean, efficient, production-ready code
+4. **Best Practices Applied**: Highlight improvements made
+
+Code to analyze:
+```python
+{code}
+```
+
+Provide your analysis in a clear, structured format with markdown formatting."""
+
+    return [
+        {"role": "system", "content": "You are an expert Python code reviewer and refactoring specialist."},
+        {"role": "user", "content": prompt}
+    ]
+
+def analyze_chunk(chunk: CodeChunk, api_key: str, model: str = "qwen-turbo", priority: int = INTERACTIVE,
+                  findings: Optional[List[Finding]] = None) -> str:
+    """
+    Analyze a single section of a larger file, using the rest of the file as context
+
+    findings are the whole file's static check results; only those inside
+    the chunk's line range are included.
+    """
+    with span("prompt.build", section=chunk.label) as prompt_span:
+        messages = _build_chunk_messages(chunk, findings_in_range(findings or [], chunk.start_line, chunk.end_line))
+        prompt_span.set(prompt_chars=sum(len(m["content"]) for m in messages))
+
+    return call_qwen(messages, api_key, model, max_tokens=CHUNK_MAX_TOKENS, priority=priority)
+
+def _build_chunk_messages(chunk: CodeChunk, findings: List[Finding]) -> list:
+    context_block = f"""Context from the rest of the file (imports and signatures only - do NOT review this):
+```python
+{chunk.context}
+```
+
+""" if chunk.context else ""
+
+    prompt = f"""You are an expert Python developer and code reviewer.
+You are reviewing one section of a larger file: {chunk.label}.
+
+{context_block}Analyze ONLY the following section and provide:
+
+{_review_instructions(findings)}
+3. **Refactored Code**: Provide clean, efficient, production-ready code for this section
+4. **Best Practices Applied**: Highlight improvements made
+
+Section to analyze:
+```python
+{chunk.source}
+```
+
+Be concise - this report will be merged with reports for the other sections."""
+
+    return [
+        {"role": "system", "content": "You are an expert Python code reviewer and refactoring specialist."},
+        {"role": "user", "content": prompt}
+    ]
+
+def analyze_code_chunked(code: str, api_key: str, model: str = "qwen-turbo",
+                         max_workers: int = 4, max_chunk_lines: int = DEFAULT_MAX_CHUNK_LINES,
+                         priority: int = INTERACTIVE, findings: Optional[List[Finding]] = None) -> str:
+    """Split code along AST boundaries, analyze the chunks concurrently and merge the findings"""
+    findings = _static_check_findings(code, findings)
+    with span("chunk", code_lines=len(code.splitlines())) as chunk_span:
+        chunks = split_code_into_chunks(code, max_chunk_lines)
+        chunk_span.set(chunks=len(chunks))
+    if len(chunks) == 1:
+        return analyze_code(code, api_key, model, priority, findings)
+
+    reports = [""] * len(chunks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(propagate(analyze_chunk), chunk, api_key, model, priority, findings): i
+            for i, chunk in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            reports[futures[future]] = future.result()
+
+    if all(r.startswith("❌") for r in reports):
+        return reports[0]
+    with span("merge", chunks=len(chunks)):
+        return merge_chunk_reports(chunks, reports)
+
+def _pack_key(model: str, unit_hashes: List[str]) -> str:
+    """Cache key for a request covering these units (a single unit keeps its own hash)"""
+    if len(unit_hashes) == 1:
+        return f"{model}:{unit_hashes[0]}"
+    return f"{model}:{hashlib.sha256('+'.join(unit_hashes).encode('utf-8')).hexdigest()}"
+
+def _plan_incremental(units: List[CodeChunk], unit_hashes: List[str], model: str, cache: dict,
+                      max_chunk_lines: int) -> tuple:
+    """
+    Group units into requests: (groups of unit indices, whether each group is cached).
+
+    At each position the longest run of units cached together is reused;
+    the units in between are cache misses and are packed up to
+    max_chunk_lines per request, just like chunked mode.
+    """
+    groups, cached, misses = [], [], []
+
+    def flush_misses():
+        for group in group_units([units[i] for i in misses], max_chunk_lines):
+            groups.append([misses[i] for i in group])
+            cached.append(False)
+        misses.clear()
+
+    i = 0
+    while i < len(units):
+        match = None
+        for j in range(i, len(units)):
+            if j > i and units[j].end_line - units[i].start_line + 1 > max_chunk_lines:
+                break
+            if _pack_key(model, unit_hashes[i:j + 1]) in cache:
+                match = j
+        if match is None:
+            misses.append(i)
+            i += 1
+            continue
+        flush_misses()
+        groups.append(list(range(i, match + 1)))
+        cached.append(True)
+        i = match + 1
+    flush_misses()
+    return groups, cached
+
+def analyze_code_incremental(code: str, api_key: str, model: str, cache: dict,
+                             max_workers: int = 4, max_chunk_lines: int = DEFAULT_MAX_CHUNK_LINES,
+                             priority: int = INTERACTIVE, findings: Optional[List[Finding]] = None) -> tuple:
+    """
+    Analyze code function-by-function, reusing cached results for unchanged functions.
+
+    Each function (method, class body, run of module-level code) is hashed
+    on its own; adjacent changed units are packed into one request whose
+    reply is cached under the combined key of its units. Returns
+    (report, stats) where stats describes how much was served from cache.
+    """
+    findings = _static_check_findings(code, findings)
+    with span("chunk", code_lines=len(code.splitlines())) as chunk_span:
+        units = split_code_into_chunks(code, max_chunk_lines, pack=False)
+        unit_hashes = [chunk_hash(unit) for unit in units]
+        groups, cached = _plan_incremental(units, unit_hashes, model, cache, max_chunk_lines)
+        chunks = combine_units(code, units, groups)
+        keys = [_pack_key(model, [unit_hashes[i] for i in group]) for group in groups]
+
+        reports = [cache[key] if hit else "" for key, hit in zip(keys, cached)]
+        pending = [i for i, hit in enumerate(cached) if not hit]
+        chunk_span.set(units=len(units), chunks=len(chunks), cached=len(chunks) - len(pending))
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(propagate(analyze_chunk), chunks[i], api_key, model, priority, findings): i
+                for i in pending
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                reports[i] = future.result()
+                if not reports[i].startswith("❌"):
+                    cache[keys[i]] = reports[i]
+
+    total_lines = sum(chunk.line_count for chunk in chunks)
+    cached_lines = sum(chunk.line_count for chunk, hit in zip(chunks, cached) if hit)
+    stats = {
+        "sections": len(chunks),
+        "cached_sections": sum(cached),
+        "requests": len(pending),
+        "cached_line_ratio": cached_lines / total_lines if total_lines else 0.0,
+    }
+
+    if all(r.startswith("❌") for r in reports):
+        return reports[0], stats
+    with span("merge", chunks=len(chunks)):
+        return merge_chunk_reports(chunks, reports, cached), stats
@@ -0,0 +1,283 @@
+"""
+Code Chunker - AST-based splitting for large source files
+Splits Python code along module, class and function boundaries so each
+piece can be reviewed independently (and concurrently) by Qwen
+"""
+
+import ast
+import hashlib
+import textwrap
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# Chunks smaller than this are packed together to avoid tiny requests
+DEFAULT_MAX_CHUNK_LINES = 150
+
+
+@dataclass
+class CodeChunk:
+    """A contiguous section of a source file plus the context it needs"""
+    name: str
+    kind: str  # "module", "class", "function" or "methods"
+    start_line: int
+    end_line: int
+    source: str
+    context: str = ""
+
+    @property
+    def line_count(self) -> int:
+        return self.end_line - self.start_line + 1
+
+    @property
+    def label(self) -> str:
+        return f"{self.name} (lines {self.start_line}-{self.end_line})"
+
+
+def _node_start(node: ast.AST) -> int:
+    """First line of a node, including any decorators"""
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [d.lineno for d in decorators])
+
+
+def _function_signature(node: ast.AST, indent: str = "") -> str:
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}: ..."
+
+
+def _class_signature(node: ast.ClassDef, exclude: Optional[Tuple[int, int]] = None) -> str:
+    """Class header plus method signatures, skipping methods inside the exclude line range"""
+    bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+    header = f"class {node.name}({', '.join(bases)}):" if bases else f"class {node.name}:"
+    methods = [
+        _function_signature(item, indent="    ")
+        for item in node.body
+        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+        and not (exclude and exclude[0] <= _node_start(item) and item.end_lineno <= exclude[1])
+    ]
+    return "\n".join([header] + (methods or ["    ..."]))
+
+
+def _slice(lines: List[str], start: int, end: int) -> str:
+    return "\n".join(lines[start - 1:end])
+
+
+def _build_context(imports: List[str], signatures: List[str]) -> str:
+    parts = []
+    if imports:
+        parts.append("\n".join(imports))
+    if signatures:
+        parts.append("\n".join(signatures))
+    return "\n\n".join(parts)
+
+
+def _units_for_class(node: ast.ClassDef, lines: List[str], max_chunk_lines: int) -> List[CodeChunk]:
+    """
+    Split an oversized class into one unit per method plus one "class body" unit.
+
+    The class body unit holds the header, docstring and attributes before
+    the first method; statements between methods stay with the method
+    above them, so the units are contiguous and never overlap.
+    """
+    start, end = _node_start(node), node.end_lineno
+    if end - start + 1 <= max_chunk_lines:
+        return [CodeChunk(f"class {node.name}", "class", start, end, _slice(lines, start, end))]
+
+    methods = [item for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    if not methods:
+        return [CodeChunk(f"{node.name} (class body)", "methods", start, end, _slice(lines, start, end))]
+
+    units = []
+    body_end = _node_start(methods[0]) - 1
+    if body_end >= start:
+        units.append(CodeChunk(f"{node.name} (class body)", "methods", start, body_end,
+                               _slice(lines, start, body_end)))
+    for method, following in zip(methods, methods[1:] + [None]):
+        method_start = _node_start(method)
+        method_end = _node_start(following) - 1 if following else end
+        units.append(CodeChunk(f"{node.name}.{method.name}", "methods", method_start, method_end,
+                               _slice(lines, method_start, method_end)))
+    return units
+
+
+def _owner_class(chunk: CodeChunk) -> str:
+    """Class a "methods" unit belongs to ("Big.run" and "Big (class body)" both give "Big")"""
+    return chunk.name.split(".", 1)[0].split(" ", 1)[0]
+
+
+def _can_merge(last: CodeChunk, unit: CodeChunk, max_chunk_lines: int) -> bool:
+    if unit.end_line - last.start_line + 1 > max_chunk_lines:
+        return False
+    if unit.kind == "methods" or last.kind == "methods":
+        # Methods only merge with siblings from the same class
+        return unit.kind == last.kind and _owner_class(last) == _owner_class(unit)
+    return True
+
+
+def _merge(units: List[CodeChunk], lines: List[str]) -> CodeChunk:
+    if len(units) == 1:
+        unit = units[0]
+        return CodeChunk(unit.name, unit.kind, unit.start_line, unit.end_line, unit.source)
+    kinds = {unit.kind for unit in units}
+    return CodeChunk(
+        name=", ".join(unit.name for unit in units),
+        kind=kinds.pop() if len(kinds) == 1 else "module",
+        start_line=units[0].start_line,
+        end_line=units[-1].end_line,
+        source=_slice(lines, units[0].start_line, units[-1].end_line),
+    )
+
+
+def group_units(units: List[CodeChunk], max_chunk_lines: int = DEFAULT_MAX_CHUNK_LINES) -> List[List[int]]:
+    """Indices of adjacent units that pack into one chunk of at most max_chunk_lines"""
+    groups: List[List[int]] = []
+    packed: Optional[CodeChunk] = None
+    for i, unit in enumerate(units):
+        if packed is not None and _can_merge(packed, unit, max_chunk_lines):
+            groups[-1].append(i)
+            packed = CodeChunk(packed.name, packed.kind if packed.kind == unit.kind else "module",
+                               packed.start_line, unit.end_line, "")
+        else:
+            groups.append([i])
+            packed = unit
+    return groups
+
+
+def _attach_context(chunks: List[CodeChunk], tree: ast.Module, lines: List[str]):
+    """Give every chunk the module imports and the signatures of everything outside it"""
+    imports = [
+        _slice(lines, _node_start(node), node.end_lineno)
+        for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+    top_level = [
+        node for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    ]
+    for chunk in chunks:
+        signatures = []
+        for node in top_level:
+            inside = chunk.start_line <= _node_start(node) and node.end_lineno <= chunk.end_line
+            if inside:
+                continue
+            if isinstance(node, ast.ClassDef):
+                # A chunk holding part of an oversized class still sees the rest of its methods
+                partially_inside = chunk.start_line <= node.end_lineno and _node_start(node) <= chunk.end_line
+                exclude = (chunk.start_line, chunk.end_line) if partially_inside else None
+                signatures.append(_class_signature(node, exclude))
+            else:
+                signatures.append(_function_signature(node))
+        chunk.context = _build_context(imports, signatures)
+
+
+def combine_units(code: str, units: List[CodeChunk], groups: List[List[int]]) -> List[CodeChunk]:
+    """One chunk per group of adjacent units (see group_units), with context for the combined range"""
+    lines = code.splitlines()
+    chunks = [_merge([units[i] for i in group], lines) for group in groups]
+    try:
+        _attach_context(chunks, ast.parse(code), lines)
+    except SyntaxError:
+        pass
+    return chunks
+
+
+def split_code_into_chunks(code: str, max_chunk_lines: int = DEFAULT_MAX_CHUNK_LINES,
+                           pack: bool = True) -> List[CodeChunk]:
+    """
+    Split Python source into chunks along top-level boundaries.
+
+    Every chunk gets a context block with the module imports and the
+    signatures of the definitions that live outside the chunk. Code that
+    does not parse is returned as a single module chunk. With pack=False
+    each function, class (or method and class body of an oversized class)
+    and run of module-level statements is its own chunk.
+    """
+    lines = code.splitlines()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return [CodeChunk("module", "module", 1, max(len(lines), 1), code)]
+
+    units: List[CodeChunk] = []
+    pending_start: Optional[int] = None
+    pending_end: Optional[int] = None
+
+    def flush_pending():
+        nonlocal pending_start, pending_end
+        if pending_start is not None:
+            units.append(CodeChunk(
+                "module-level code", "module", pending_start, pending_end,
+                _slice(lines, pending_start, pending_end),
+            ))
+        pending_start = pending_end = None
+
+    for node in tree.body:
+        start, end = _node_start(node), node.end_lineno
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue  # imports go into every chunk's context instead
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            flush_pending()
+            units.append(CodeChunk(f"def {node.name}", "function", start, end, _slice(lines, start, end)))
+        elif isinstance(node, ast.ClassDef):
+            flush_pending()
+            units.extend(_units_for_class(node, lines, max_chunk_lines))
+        else:
+            if pending_start is None:
+                pending_start = start
+            pending_end = end
+    flush_pending()
+
+    if not units:
+        return [CodeChunk("module", "module", 1, max(len(lines), 1), code)]
+
+    if pack:
+        chunks = [_merge([units[i] for i in group], lines) for group in group_units(units, max_chunk_lines)]
+    else:
+        chunks = units
+    _attach_context(chunks, tree, lines)
+    return chunks
+
+
+def chunk_hash(chunk: CodeChunk) -> str:
+    """
+    Content hash of a chunk's code.
+
+    The source is hashed through its AST dump, so whitespace, comment and
+    line-number changes don't invalidate cached analyses.
+    """
+    try:
+        normalized = ast.dump(ast.parse(textwrap.dedent(chunk.source)))
+    except SyntaxError:
+        normalized = chunk.source.strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def merge_chunk_reports(chunks: List[CodeChunk], reports: List[str],
+                        cached: Optional[List[bool]] = None) -> str:
+    """Combine per-chunk analyses into a single Markdown report"""
+    cached = cached or [False] * len(chunks)
+    failed = sum(1 for r in reports if r.startswith("❌"))
+    reused = sum(cached)
+    summary = f"Analyzed **{len(chunks)}** sections concurrently"
+    if reused:
+        summary += f", **{reused}** reused from cache"
+    sections = [
+        "# 🧩 Chunked Code Analysis",
+        summary + (f" ({failed} failed)." if failed else "."),
+        "",
+        "| # | Section | Lines | Source |",
+        "|---|---------|-------|--------|",
+    ]
+    for i, (chunk, hit) in enumerate(zip(chunks, cached), 1):
+        source = "♻️ cache" if hit else "🆕 analyzed"
+        sections.append(f"| {i} | `{chunk.name}` | {chunk.start_line}-{chunk.end_line} | {source} |")
+
+    for i, (chunk, report, hit) in enumerate(zip(chunks, reports, cached), 1):
+        sections.append("")
+        sections.append("---")
+        marker = " ♻️" if hit else ""
+        sections.append(f"## {i}. `{chunk.name}` (lines {chunk.start_line}-{chunk.end_line}){marker}")
+        if report.startswith("❌"):
+            sections.append(f"⚠️ Analysis failed for this section: {report}")
+        else:
+            sections.append(report)
+    return "\n".join(sections)
@@ -0,0 +1,591 @@
+"""
+DashScope Client - rate-limit aware access to Model Studio (international)
+A process-wide scheduler keeps every request inside per-model RPM / TPM
+limits and a concurrency cap, serves interactive requests before batch
+work and retries 429s honoring Retry-After with jittered backoff.
+Slow requests can be hedged with a backup request to a faster model
+"""
+
+import heapq
+import itertools
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from issue_prompt_builder import estimate_tokens
+from tracing import annotate, propagate, span
+
+DASHSCOPE_HOST = "https://dashscope-intl.aliyuncs.com"
+DASHSCOPE_URL = f"{DASHSCOPE_HOST}/api/v1/services/aigc/text-generation/generation"
+
+# Priority lanes - lower runs first
+INTERACTIVE = 0
+BATCH = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+CANCELLED = "❌ Cancelled: another request finished first"
+
+# Output tokens reserved up front; reconciled with the real usage afterwards
+OUTPUT_TOKEN_RESERVE = 1024
+
+
+@dataclass
+class ModelLimits:
+    rpm: int
+    tpm: int
+    max_concurrency: int
+
+
+# Conservative defaults; override with DASHSCOPE_RATE_LIMITS='{"qwen-max": {"rpm": 60, ...}}'
+DEFAULT_LIMITS = {
+    "qwen-max": ModelLimits(rpm=600, tpm=1_000_000, max_concurrency=8),
+    "qwen-plus": ModelLimits(rpm=1200, tpm=1_000_000, max_concurrency=8),
+    "qwen-turbo": ModelLimits(rpm=1200, tpm=1_000_000, max_concurrency=8),
+}
+FALLBACK_LIMITS = ModelLimits(rpm=300, tpm=500_000, max_concurrency=4)
+
+
+def _limits_from_env() -> Dict[str, ModelLimits]:
+    limits = dict(DEFAULT_LIMITS)
+    raw = os.environ.get("DASHSCOPE_RATE_LIMITS")
+    if raw:
+        for model, values in json.loads(raw).items():
+            base = limits.get(model, FALLBACK_LIMITS)
+            limits[model] = ModelLimits(
+                rpm=int(values.get("rpm", base.rpm)),
+                tpm=int(values.get("tpm", base.tpm)),
+                max_concurrency=int(values.get("max_concurrency", base.max_concurrency)),
+            )
+    return limits
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_minute / 60 per second"""
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.refill_per_second = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until amount tokens are available (requests larger than the bucket only need a full bucket)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float):
+        # May go negative when reconciling real usage - that debt delays later requests
+        self.tokens = max(-self.capacity, self.tokens - amount)
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _ModelState:
+    def __init__(self, limits: ModelLimits):
+        self.limits = limits
+        self.rpm = TokenBucket(limits.rpm)
+        self.tpm = TokenBucket(limits.tpm)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.waiting = []  # heap of (priority, seq)
+        self.requests = 0
+        self.throttled = 0
+        self.delays = deque(maxlen=500)  # (lane, queue delay seconds)
+
+
+@dataclass
+class Ticket:
+    model: str
+    reserved_tokens: int
+    priority: int
+    queue_delay: float
+
+
+class RateLimitScheduler:
+    """
+    Client-side admission control for DashScope.
+
+    Each model has its own request and token buckets, a concurrency cap
+    and a priority queue; a waiter is admitted only when it is at the
+    head of its model's queue and every limit allows it.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, ModelLimits]] = None):
+        self._limits = limits or _limits_from_env()
+        self._models: Dict[str, _ModelState] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def _state(self, model: str) -> _ModelState:
+        if model not in self._models:
+            self._models[model] = _ModelState(self._limits.get(model, FALLBACK_LIMITS))
+        return self._models[model]
+
+    def limits(self, model: str) -> ModelLimits:
+        with self._cond:
+            return self._state(model).limits
+
+    def set_limits(self, model: str, limits: ModelLimits):
+        with self._cond:
+            state = self._state(model)
+            state.limits = limits
+            state.rpm, state.tpm = TokenBucket(limits.rpm), TokenBucket(limits.tpm)
+            self._cond.notify_all()
+
+    def acquire(self, model: str, tokens: int, priority: int = INTERACTIVE) -> Ticket:
+        """Block until the request may be sent; returns a ticket to pass to release()"""
+        start = time.monotonic()
+        with self._cond:
+            state = self._state(model)
+            entry = (priority, next(self._seq))
+            heapq.heappush(state.waiting, entry)
+            try:
+                while True:
+                    wait = 1.0
+                    if state.waiting[0] == entry and state.in_flight < state.limits.max_concurrency:
+                        now = time.monotonic()
+                        wait = max(
+                            state.blocked_until - now,
+                            state.rpm.time_until(1, now),
+                            state.tpm.time_until(tokens, now),
+                        )
+                        if wait <= 0:
+                            break
+                    self._cond.wait(timeout=wait)
+            except BaseException:
+                state.waiting.remove(entry)
+                heapq.heapify(state.waiting)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(state.waiting)
+            state.rpm.consume(1)
+            state.tpm.consume(tokens)
+            state.in_flight += 1
+            state.requests += 1
+            delay = time.monotonic() - start
+            state.delays.append((priority, delay))
+            self._cond.notify_all()
+        return Ticket(model, tokens, priority, delay)
+
+    def release(self, ticket: Ticket, actual_tokens: Optional[int] = None):
+        """Free the concurrency slot and reconcile the token reservation with real usage"""
+        with self._cond:
+            state = self._state(ticket.model)
+            state.in_flight -= 1
+            if actual_tokens is not None:
+                diff = actual_tokens - ticket.reserved_tokens
+                if diff > 0:
+                    state.tpm.consume(diff)
+                else:
+                    state.tpm.refund(-diff)
+            self._cond.notify_all()
+
+    def penalize(self, model: str, seconds: float, throttled: bool = True):
+        """Hold every request for model for the given time (after a 429 or 5xx)"""
+        with self._cond:
+            state = self._state(model)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+            state.throttled += int(throttled)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-model counters and queueing delay percentiles, per lane"""
+        with self._cond:
+            snapshot = {}
+            for model, state in self._models.items():
+                lanes = {}
+                for priority, name in LANE_NAMES.items():
+                    delays = sorted(d for p, d in state.delays if p == priority)
+                    if delays:
+                        lanes[name] = {
+                            "samples": len(delays),
+                            "p50": delays[len(delays) // 2],
+                            "p95": delays[min(len(delays) - 1, int(len(delays) * 0.95))],
+                            "max": delays[-1],
+                        }
+                snapshot[model] = {
+                    "requests": state.requests,
+                    "throttled": state.throttled,
+                    "in_flight": state.in_flight,
+                    "waiting": len(state.waiting),
+                    "limits": vars(state.limits),
+                    "queue_delay": lanes,
+                }
+            return snapshot
+
+
+_scheduler: Optional[RateLimitScheduler] = None
+_scheduler_lock = threading.Lock()
+
+# Shared keep-alive connection pool, sized for fan-out
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+
+def warm_up_connection(timeout: float = 5.0) -> float:
+    """
+    Open (or reuse) a pooled TLS connection to DashScope ahead of the first request.
+
+    Returns the seconds spent; failures are ignored because the real
+    request will surface them.
+    """
+    started = time.monotonic()
+    try:
+        _session.head(DASHSCOPE_HOST, timeout=timeout)
+    except requests.RequestException:
+        pass
+    return time.monotonic() - started
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """The process-wide scheduler shared by every session and thread"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler()
+        return _scheduler
+
+
+def _retry_delay(response, attempt: int) -> float:
+    """Honor Retry-After (seconds or HTTP date) and add jitter; otherwise full-jitter exponential backoff"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = 0.0
+        if seconds > 0:
+            return min(BACKOFF_MAX_SECONDS, seconds) + random.uniform(0, 0.1 * seconds + 0.25)
+    ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def _error_message(response) -> str:
+    try:
+        error_detail = response.json()
+        msg = error_detail.get("message", "Unknown error")
+        code_err = error_detail.get("code", "N/A")
+        return f"❌ API Error {response.status_code} [{code_err}]: {msg}"
+    except ValueError:
+        return f"❌ API Error {response.status_code}: {response.text}"
+
+
+class CancelToken:
+    """
+    Event-like flag whose callbacks run when it is set (used to close in-flight streams).
+
+    Callbacks run on a daemon thread, so set() returns at once even if
+    closing a connection blocks behind a reader waiting for bytes.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        if callbacks:
+            threading.Thread(target=self._run, args=(callbacks,), name="cancel-callbacks", daemon=True).start()
+
+    @staticmethod
+    def _run(callbacks: list):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback: Callable[[], None]):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+def _abort_response(response):
+    """Shut the socket down so a reader blocked in iter_lines() wakes up, then close the response"""
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+def _read_stream(response, cancel: Optional[CancelToken], on_first_token, started: float, model: str) -> tuple:
+    """
+    Consume a DashScope SSE stream (incremental_output) and return (content, usage).
+
+    Returns content=None if cancel was set mid-stream; the connection is closed.
+    """
+    parts = []
+    usage = {}
+    first = True
+    received = 0
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if cancel is not None and cancel.is_set():
+                return None, usage
+            if not line or not line.startswith("data:"):
+                continue
+            received += len(line)
+            data = json.loads(line[len("data:"):])
+            if "code" in data and "output" not in data:
+                return f"❌ API Error [{data.get('code')}]: {data.get('message', 'Unknown error')}", usage
+            chunk = data.get("output", {}).get("choices", [{}])[0].get("message", {}).get("content", "")
+            if chunk and first:
+                first = False
+                ttft = time.monotonic() - started
+                _latency.record(model, ttft)
+                annotate(first_token_s=round(ttft, 3))
+                if on_first_token:
+                    on_first_token()
+            parts.append(chunk)
+            usage = data.get("usage", usage)
+    finally:
+        annotate(response_bytes=received)
+        response.close()
+    return "".join(parts), usage
+
+
+def chat_completion(messages: list, api_key: str, model: str, max_tokens: int = 3000,
+                    temperature: float = 0.3, timeout: int = 90, priority: int = INTERACTIVE,
+                    user_agent: Optional[str] = None, max_retries: int = MAX_RETRIES,
+                    stream: bool = False, cancel: Optional[CancelToken] = None,
+                    on_first_token: Optional[Callable[[], None]] = None) -> str:
+    """
+    Send a chat request through the scheduler and return the reply (or an ❌ error string).
+
+    Retryable failures (429 and 5xx) pause the model for the Retry-After
+    period so concurrent requests back off together. With stream=True the
+    reply is read as server-sent events, on_first_token fires when the
+    first content arrives (its latency feeds the hedging thresholds) and
+    setting cancel aborts the request.
+    """
+    with span("dashscope.chat", model=model, stream=stream, max_tokens=max_tokens) as chat_span:
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        if user_agent:
+            headers["User-Agent"] = user_agent
+
+        with span("serialize") as serialize_span:
+            payload = {
+                "model": model,
+                "input": {"messages": messages},
+                "parameters": {
+                    "result_format": "message",
+                    "max_tokens": max_tokens,
+                    "temperature": temperature
+                }
+            }
+            if stream:
+                headers["X-DashScope-SSE"] = "enable"
+                payload["parameters"]["incremental_output"] = True
+            body = json.dumps(payload).encode("utf-8")
+            serialize_span.set(request_bytes=len(body))
+
+        scheduler = get_scheduler()
+        reserved = sum(estimate_tokens(m["content"]) for m in messages) + min(max_tokens, OUTPUT_TOKEN_RESERVE)
+
+        for attempt in range(max_retries + 1):
+            with span("rate_limit.wait", reserved_tokens=reserved):
+                ticket = scheduler.acquire(model, reserved, priority)
+            usage = {}
+            try:
+                if cancel is not None and cancel.is_set():
+                    return CANCELLED
+                started = time.monotonic()
+                with span("http.request", attempt=attempt, request_bytes=len(body)) as http_span:
+                    response = _session.post(DASHSCOPE_URL, headers=headers, data=body, timeout=timeout, stream=stream)
+                    http_span.set(status=response.status_code)
+                if response.status_code == 200:
+                    if stream:
+                        if cancel is not None:
+                            cancel.on_cancel(lambda: _abort_response(response))
+                        with span("http.stream"):
+                            content, usage = _read_stream(response, cancel, on_first_token, started, model)
+                        return CANCELLED if content is None else content
+                    with span("parse", response_bytes=len(response.content)):
+                        data = response.json()
+                        usage = data.get("usage", {})
+                        return data.get("output", {}).get("choices", [{}])[0].get("message", {}).get("content", "")
+                # Error responses are closed so a streamed one doesn't keep its pooled connection checked out
+                try:
+                    if response.status_code in RETRYABLE_STATUS and attempt < max_retries:
+                        throttled = response.status_code == 429
+                        scheduler.penalize(model, _retry_delay(response, attempt), throttled=throttled)
+                        continue
+                    if response.status_code == 429:
+                        return f"{_error_message(response)} (still rate limited after {attempt} retries)"
+                    return _error_message(response)
+                finally:
+                    response.close()
+            except Exception as e:
+                if cancel is not None and cancel.is_set():
+                    return CANCELLED
+                return f"❌ Exception: {str(e)}"
+            finally:
+                scheduler.release(ticket, usage.get("total_tokens"))
+                if usage:
+                    chat_span.set(**{key: value for key, value in usage.items() if isinstance(value, int)})
+        return "❌ Exception: retries exhausted"
+
+
+@dataclass
+class HedgePolicy:
+    """
+    When to send a backup request for a slow one.
+
+    If the primary has produced no token after the `percentile` of recent
+    first-token latencies (clamped to [min_delay, max_delay]; initial_delay
+    until enough samples exist), a hedge goes to fallback_model (or the
+    same model). Hedges are capped at max_hedge_rate of all requests.
+    """
+    fallback_model: Optional[str] = None
+    percentile: float = 0.95
+    initial_delay: float = 8.0
+    min_delay: float = 1.0
+    max_delay: float = 30.0
+    max_hedge_rate: float = 0.1
+
+
+class LatencyTracker:
+    """Recent time-to-first-token samples per model"""
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, window: int = 200):
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._window = window
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+_latency = LatencyTracker()
+_hedge_lock = threading.Lock()
+_hedge_counts = {"requests": 0, "hedged": 0, "hedge_wins": 0, "primary_wins": 0, "budget_denied": 0}
+
+
+def hedge_delay(model: str, policy: HedgePolicy) -> float:
+    observed = _latency.percentile(model, policy.percentile)
+    if observed is None:
+        return policy.initial_delay
+    return min(policy.max_delay, max(policy.min_delay, observed))
+
+
+def hedge_stats() -> Dict:
+    """Hedge rate and win statistics since process start"""
+    with _hedge_lock:
+        counts = dict(_hedge_counts)
+    counts["hedge_rate"] = counts["hedged"] / counts["requests"] if counts["requests"] else 0.0
+    counts["hedge_win_rate"] = counts["hedge_wins"] / counts["hedged"] if counts["hedged"] else 0.0
+    return counts
+
+
+def _count(key: str):
+    with _hedge_lock:
+        _hedge_counts[key] += 1
+
+
+def hedged_chat_completion(messages: list, api_key: str, model: str, max_tokens: int = 3000,
+                           temperature: float = 0.3, timeout: int = 120, priority: int = INTERACTIVE,
+                           policy: Optional[HedgePolicy] = None, user_agent: Optional[str] = None) -> tuple:
+    """
+    chat_completion with a tail-latency hedge.
+
+    Returns (reply, served_by) where served_by names the model that
+    produced the reply. The losing request is cancelled.
+    """
+    policy = policy or HedgePolicy()
+    hedge_model = policy.fallback_model or model
+    common = dict(max_tokens=max_tokens, temperature=temperature, timeout=timeout, priority=priority,
+                  user_agent=user_agent, stream=True)
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        primary_cancel = CancelToken()
+        primary_progress = threading.Event()
+        primary = executor.submit(propagate(chat_completion), messages, api_key, model, cancel=primary_cancel,
+                                  on_first_token=primary_progress.set, **common)
+        primary.add_done_callback(lambda f: primary_progress.set())
+        _count("requests")
+
+        if primary_progress.wait(timeout=hedge_delay(model, policy)):
+            return primary.result(), model
+
+        with _hedge_lock:
+            allowed = _hedge_counts["hedged"] + 1 <= policy.max_hedge_rate * _hedge_counts["requests"] + 1
+            if allowed:
+                _hedge_counts["hedged"] += 1
+            else:
+                _hedge_counts["budget_denied"] += 1
+        if not allowed:
+            return primary.result(), model
+
+        hedge_cancel = CancelToken()
+        hedge = executor.submit(propagate(chat_completion), messages, api_key, hedge_model, cancel=hedge_cancel, **common)
+
+        # Whichever succeeds first wins; an error only counts if both fail
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in done if not f.result().startswith("❌")), None)
+            if winner is not None:
+                if winner is hedge:
+                    primary_cancel.set()
+                    _count("hedge_wins")
+                    return hedge.result(), f"{hedge_model} (hedge)"
+                hedge_cancel.set()
+                _count("primary_wins")
+                return primary.result(), model
+        return primary.result(), model
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,303 @@
+"""
+Issue Clustering - local TF-IDF + k-means pre-processing for GitHub issues
+Groups similar issues on the CPU so only cluster summaries and a few
+representative issues need to be sent to Qwen
+"""
+
+import re
+from collections import Counter
+from itertools import chain
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from issue_prompt_builder import truncate_text, estimate_tokens
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9_]{2,}")
+
+STOPWORDS = frozenset("""
+the and for with when that this from are was not but have has had can will would should could
+been being into than then them they their there what which while where who how why does did doing
+its it's also just like get got use using used make makes any all some more most very only other
+such our out over same each few both after before again about above below between through during
+expected actual behavior issue error steps reproduce need needs still even new one two
+""".split())
+
+# Labels are strong signals - count each one like this many words
+LABEL_WEIGHT = 3
+MAX_AUTO_CLUSTERS = 30
+
+# Bounds that keep clustering in seconds on 100k+ issues: only the start of long
+# bodies is tokenized, each issue keeps its strongest terms, terms seen in a single
+# issue are dropped (they can't make two issues similar), similarities only use
+# each centroid's strongest terms and centroids are fitted on a sample before one
+# assignment pass over every issue
+MAX_BODY_CHARS = 500
+MAX_TERMS_PER_ISSUE = 64
+MIN_DOC_FREQ = 2
+KMEANS_SAMPLE_SIZE = 20000
+CENTROID_TERMS = 256
+
+
+@dataclass
+class IssueCluster:
+    """A group of similar issues plus the summary sent to the model"""
+    cluster_id: int
+    size: int
+    top_terms: List[str]
+    label_counts: Dict[str, int]
+    state_counts: Dict[str, int]
+    total_comments: int
+    representatives: List[Dict] = field(default_factory=list)
+    issue_numbers: List[int] = field(default_factory=list)
+
+
+def _tokenize(issue: Dict) -> List[str]:
+    # Titles count twice; stopwords are dropped per column in build_tfidf
+    title = TOKEN_PATTERN.findall(str(issue.get("title", "")).lower())
+    body = TOKEN_PATTERN.findall((issue.get("body", "") or "")[:MAX_BODY_CHARS].lower())
+    labels = [f"label:{str(label).lower()}" for label in issue.get("labels", []) or []]
+    return title + title + body + labels * LABEL_WEIGHT
+
+
+def _row_starts(rows: np.ndarray) -> np.ndarray:
+    """Index of the first non-zero of every row present in a row-sorted coordinate array"""
+    if len(rows) == 0:
+        return np.zeros(0, np.int64)
+    return np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+
+
+def build_tfidf(issues: List[Dict]):
+    """
+    Build an L2-normalized TF-IDF matrix in coordinate form.
+
+    Returns (rows, cols, vals, vocab) where rows/cols/vals are parallel
+    arrays of the non-zero entries, sorted by row, and vocab maps
+    column -> term. Terms in fewer than MIN_DOC_FREQ issues are dropped
+    and each issue keeps at most MAX_TERMS_PER_ISSUE terms.
+    """
+    token_lists = [_tokenize(issue) for issue in issues]
+    all_tokens = list(chain.from_iterable(token_lists))
+    empty = np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float32), []
+    if not all_tokens:
+        return empty
+
+    # Vocabulary and column ids are built in bulk; np.unique collapses repeats into term counts
+    vocab = {term: col for col, term in enumerate(dict.fromkeys(all_tokens))}
+    n_rows, n_vocab = len(issues), len(vocab)
+    token_cols = np.fromiter(map(vocab.__getitem__, all_tokens), np.int64, len(all_tokens))
+    token_rows = np.repeat(np.arange(n_rows, dtype=np.int64), [len(tokens) for tokens in token_lists])
+    flat, counts = np.unique(token_rows * n_vocab + token_cols, return_counts=True)
+    rows, cols = flat // n_vocab, flat % n_vocab
+
+    df = np.bincount(cols, minlength=n_vocab)
+    df[[vocab[word] for word in STOPWORDS if word in vocab]] = 0
+    used = np.flatnonzero(df >= min(MIN_DOC_FREQ, n_rows))
+    if len(used) == 0:
+        return empty
+    new_col = np.full(n_vocab, -1, np.int64)
+    new_col[used] = np.arange(len(used))
+    keep = new_col[cols] >= 0
+    rows, cols, counts = rows[keep], new_col[cols[keep]], counts[keep].astype(np.float64)
+
+    idf = np.log((1.0 + n_rows) / (1.0 + df[used])) + 1.0
+    vals = (1.0 + np.log(counts)) * idf[cols]
+
+    # Keep each issue's strongest terms: sort by row, then by descending weight within the row
+    # (one argsort on a combined key - np.lexsort is ~10x slower here), then restore positions
+    order = np.argsort(rows - vals / (2.0 * vals.max()), kind="stable")
+    starts = _row_starts(rows[order])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    selected = np.sort(order[rank < MAX_TERMS_PER_ISSUE])
+    rows, cols, vals = rows[selected], cols[selected], vals[selected]
+
+    norms = np.sqrt(np.bincount(rows, weights=vals ** 2, minlength=n_rows))
+    vals = (vals / np.maximum(norms[rows], 1e-12)).astype(np.float32)
+
+    terms = list(vocab)
+    return rows, cols, vals, [terms[c] for c in used]
+
+
+def _similarities(rows, cols, vals, centroids: np.ndarray, n_rows: int) -> np.ndarray:
+    """
+    Sparse X @ centroids.T over each centroid's CENTROID_TERMS strongest terms.
+
+    Centroids are pruned and inverted (term -> centroids that keep it), so
+    every non-zero only meets the few centroids that share its term and the
+    whole product is one bincount; the small weight that pruning drops
+    barely moves the argmax.
+    """
+    k, n_cols = centroids.shape
+    top = np.argpartition(-centroids, min(CENTROID_TERMS, n_cols) - 1, axis=1)[:, :CENTROID_TERMS]
+    weights = np.take_along_axis(centroids, top, axis=1)
+    kept = weights > 0
+    terms, owners, weights = top[kept], np.nonzero(kept)[0], weights[kept]
+    order = np.argsort(terms, kind="stable")
+    terms, owners, weights = terms[order], owners[order], weights[order]
+
+    # Expand each non-zero into one entry per centroid that keeps its term
+    term_ptr = np.searchsorted(terms, np.arange(n_cols + 1))
+    first, hits = term_ptr[cols], term_ptr[cols + 1] - term_ptr[cols]
+    entry = np.repeat(np.arange(len(cols)), hits)
+    pair = np.repeat(first - (np.cumsum(hits) - hits), hits) + np.arange(len(entry))
+    sims = np.bincount(
+        rows[entry] * k + owners[pair], weights=vals[entry] * weights[pair], minlength=n_rows * k
+    )
+    return sims.reshape(n_rows, k).astype(np.float32)
+
+
+def _centroids(rows, cols, vals, assignments: np.ndarray, k: int, n_cols: int) -> np.ndarray:
+    """Mean direction of every cluster, L2-normalized (spherical k-means)"""
+    flat = assignments[rows].astype(np.int64) * n_cols + cols
+    centroids = np.bincount(flat, weights=vals, minlength=k * n_cols).reshape(k, n_cols)
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    return (centroids / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _dense_rows(rows, cols, vals, indices: np.ndarray, n_cols: int) -> np.ndarray:
+    dense = np.zeros((len(indices), n_cols), np.float32)
+    for out, idx in enumerate(indices):
+        lo, hi = np.searchsorted(rows, idx, "left"), np.searchsorted(rows, idx, "right")
+        dense[out, cols[lo:hi]] = vals[lo:hi]
+    return dense
+
+
+def _sample_rows(rows, cols, vals, n_rows: int, size: int, rng) -> tuple:
+    """Coordinate arrays restricted to a random sample of rows, renumbered 0..size-1"""
+    in_sample = np.zeros(n_rows, bool)
+    in_sample[rng.choice(n_rows, size, replace=False)] = True
+    renumber = np.cumsum(in_sample) - 1
+    mask = in_sample[rows]
+    return renumber[rows[mask]], cols[mask], vals[mask]
+
+
+def _kmeans_plus_plus(rows, cols, vals, k: int, n_rows: int, n_cols: int, rng) -> np.ndarray:
+    """k-means++ seeding: pick new centroids far (in cosine terms) from the chosen ones"""
+    chosen = [int(rng.integers(n_rows))]
+    closest = np.full(n_rows, -1.0, np.float32)
+    for _ in range(1, k):
+        last = _dense_rows(rows, cols, vals, np.array(chosen[-1:]), n_cols)
+        closest = np.maximum(closest, _similarities(rows, cols, vals, last, n_rows)[:, 0])
+        weights = np.clip(1.0 - closest, 0.0, None).astype(np.float64) ** 2
+        weights[chosen] = 0.0
+        total = weights.sum()
+        if total <= 0:
+            remaining = np.setdiff1d(np.arange(n_rows), chosen)
+            chosen.append(int(rng.choice(remaining)))
+        else:
+            chosen.append(int(rng.choice(n_rows, p=weights / total)))
+    return _dense_rows(rows, cols, vals, np.array(chosen), n_cols)
+
+
+def _weighted_counts(values_per_issue, weights: List[int]) -> Counter:
+    counts = Counter()
+    for values, weight in zip(values_per_issue, weights):
+        for value in values:
+            counts[value] += weight
+    return counts
+
+
+def cluster_issues(issues: List[Dict], n_clusters: Optional[int] = None, n_iter: int = 15,
+                   reps_per_cluster: int = 3, seed: int = 0) -> List[IssueCluster]:
+    """
+    Cluster issues with TF-IDF over title + body + labels and spherical k-means.
+
+    Everything is vectorized over the sparse non-zeros, so cost grows with
+    the total number of terms rather than issues x vocabulary; above
+    KMEANS_SAMPLE_SIZE issues the centroids are fitted on a random sample
+    and every issue is then assigned to its nearest centroid. Clusters are
+    returned largest first, each with its most central issues as
+    representatives. Issues carrying a "duplicates" count (see issue_dedup)
+    are weighted by the number of reports they stand for.
+    """
+    n = len(issues)
+    if n == 0:
+        return []
+    if n_clusters is None:
+        n_clusters = int(round(np.sqrt(n / 2)))
+        n_clusters = min(MAX_AUTO_CLUSTERS, max(2, n_clusters))
+    k = max(1, min(n_clusters, n))
+
+    rows, cols, vals, terms = build_tfidf(issues)
+    n_cols = max(len(terms), 1)
+
+    rng = np.random.default_rng(seed)
+    assignments = np.zeros(n, np.int64)
+    best = np.zeros(n, np.float32)
+    if len(terms):
+        fit_rows, fit_cols, fit_vals, fit_n = rows, cols, vals, n
+        if n > KMEANS_SAMPLE_SIZE:
+            fit_rows, fit_cols, fit_vals = _sample_rows(rows, cols, vals, n, KMEANS_SAMPLE_SIZE, rng)
+            fit_n = KMEANS_SAMPLE_SIZE
+        centroids = _kmeans_plus_plus(fit_rows, fit_cols, fit_vals, k, fit_n, n_cols, rng)
+        fit_assignments = np.zeros(fit_n, np.int64)
+        for iteration in range(n_iter):
+            new_assignments = _similarities(fit_rows, fit_cols, fit_vals, centroids, fit_n).argmax(axis=1)
+            if iteration > 0 and np.array_equal(new_assignments, fit_assignments):
+                break
+            fit_assignments = new_assignments
+            centroids = _centroids(fit_rows, fit_cols, fit_vals, fit_assignments, k, n_cols)
+        sims = _similarities(rows, cols, vals, centroids, n)
+        assignments = sims.argmax(axis=1)
+        best = sims[np.arange(n), assignments]
+    else:
+        centroids = np.zeros((k, n_cols), np.float32)
+
+    clusters = []
+    for j in range(k):
+        members = np.flatnonzero(assignments == j)
+        if len(members) == 0:
+            continue
+        member_issues = [issues[i] for i in members]
+        weights = [1 + int(issue.get("duplicates") or 0) for issue in member_issues]
+        top_cols = np.argsort(centroids[j])[::-1][:8] if len(terms) else []
+        central = members[np.argsort(best[members])[::-1][:reps_per_cluster]]
+        clusters.append(IssueCluster(
+            cluster_id=j,
+            size=sum(weights),
+            top_terms=[terms[c] for c in top_cols if centroids[j, c] > 0 and not terms[c].startswith("label:")],
+            label_counts=dict(_weighted_counts(
+                ((str(label) for label in issue.get("labels", []) or []) for issue in member_issues), weights
+            ).most_common(6)),
+            state_counts=dict(_weighted_counts(
+                ([str(issue.get("state", "unknown"))] for issue in member_issues), weights
+            )),
+            total_comments=sum(int(issue.get("comments", 0) or 0) for issue in member_issues),
+            representatives=[issues[i] for i in central],
+            issue_numbers=[
+                number for i in members
+                for number in [issues[i].get("number")] + list(issues[i].get("duplicate_numbers", []) or [])
+            ],
+        ))
+
+    clusters.sort(key=lambda c: c.size, reverse=True)
+    for new_id, cluster in enumerate(clusters, 1):
+        cluster.cluster_id = new_id
+    return clusters
+
+
+def serialize_clusters(clusters: List[IssueCluster], body_chars: int = 200, reps: int = 3) -> str:
+    """Compact text summary of clusters and their representative issues, for the prompt"""
+    lines = []
+    for c in clusters:
+        labels = ", ".join(f"{name}({count})" for name, count in c.label_counts.items())
+        states = ", ".join(f"{state} {count}" for state, count in c.state_counts.items())
+        lines.append(
+            f"C{c.cluster_id} | {c.size} issues | terms: {', '.join(c.top_terms)} | labels: {labels} "
+            f"| {states} | {c.total_comments} comments"
+        )
+        for issue in c.representatives[:reps]:
+            body = truncate_text(issue.get("body", ""), body_chars)
+            lines.append(f"  - #{issue.get('number')} {issue.get('title', '')}" + (f": {body}" if body else ""))
+    return "\n".join(lines)
+
+
+def build_cluster_payload(clusters: List[IssueCluster], token_budget: int) -> str:
+    """Serialize clusters, trimming representative bodies and counts until the text fits token_budget"""
+    text = ""
+    for body_chars, reps in ((200, 3), (100, 3), (0, 3), (0, 2), (0, 1), (0, 0)):
+        text = serialize_clusters(clusters, body_chars, reps)
+        if estimate_tokens(text) <= token_budget:
+            break
+    return text
@@ -0,0 +1,214 @@
+"""
+Issue Dedup - MinHash + LSH near-duplicate detection for GitHub issues
+Groups issues whose title + body shingles overlap heavily, in roughly
+linear time, so only one representative per group (with a duplicate
+count) needs to be sent to Qwen
+"""
+
+import string
+import zlib
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# ASCII punctuation splits words like \W does; text is then split on whitespace in C
+WORD_SEPARATORS = str.maketrans({c: " " for c in string.punctuation.replace("_", "")})
+
+# Only the start of long bodies is shingled; duplicates diverge early or not at all
+MAX_SHINGLE_CHARS = 2000
+EMPTY_SLOT = np.uint32(0xFFFFFFFF)
+# Issues hashed per batch, to bound the size of the per-shingle arrays
+SIGNATURE_BATCH = 8192
+_GRAM_MULTIPLIER = np.uint64(0x9E3779B1)
+_LOW_32_BITS = np.uint64(0xFFFFFFFF)
+
+
+@dataclass
+class DuplicateGroup:
+    """Near-duplicate issues; the representative is the one sent to the model"""
+    representative: Dict
+    members: List[Dict]
+
+    @property
+    def size(self) -> int:
+        return len(self.members)
+
+    @property
+    def duplicate_numbers(self) -> List:
+        return [m.get("number") for m in self.members if m is not self.representative]
+
+
+def _shingle_hashes(issues: List[Dict], size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    32-bit hashes of every word shingle, concatenated, plus the shingle count per issue.
+
+    Each word is crc32-hashed once; shingle hashes are combined from word
+    hashes with array operations. An issue with fewer than size words gets
+    one shingle of all its words. Repeated shingles are kept - they don't
+    change a minimum.
+    """
+    word_lists = [
+        f"{issue.get('title', '')} {issue.get('body', '') or ''}"[:MAX_SHINGLE_CHARS]
+        .lower().translate(WORD_SEPARATORS).encode("utf-8").split()
+        for issue in issues
+    ]
+    counts = np.fromiter(map(len, word_lists), dtype=np.int64, count=len(issues))
+    total = int(counts.sum())
+    words = np.fromiter(map(zlib.crc32, chain.from_iterable(word_lists)), dtype=np.uint64, count=total)
+    owner = np.repeat(np.arange(len(issues)), counts)
+
+    grams = words.copy()
+    for k in range(1, size):
+        next_word = np.zeros(total, dtype=np.uint64)
+        next_word[:total - k] = np.where(owner[k:] == owner[:total - k], words[k:], 0)
+        grams = ((grams * _GRAM_MULTIPLIER) & _LOW_32_BITS) ^ next_word
+
+    # A shingle starts wherever its last word belongs to the same issue, plus at the start of short issues
+    keep = np.zeros(total, dtype=bool)
+    if total >= size:
+        keep[:total - size + 1] = owner[size - 1:] == owner[:total - size + 1]
+    starts = np.cumsum(counts) - counts
+    keep[starts[(counts > 0) & (counts < size)]] = True
+    return grams[keep], np.bincount(owner[keep], minlength=len(issues))
+
+
+def minhash_signatures(issues: List[Dict], num_perm: int = 64, shingle_size: int = 3,
+                       seed: int = 0) -> np.ndarray:
+    """
+    (n, num_perm) MinHash signatures over word shingles.
+
+    Each permutation is a multiply-shift hash ((a * x + b) >> 32 with odd
+    64-bit a) applied to all shingle hashes of a batch at once, with a
+    per-issue minimum via reduceat; issues with no words get a signature
+    of EMPTY_SLOT values.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+    shift = np.uint64(32)
+
+    signatures = np.full((len(issues), num_perm), EMPTY_SLOT, dtype=np.uint32)
+    for batch_start in range(0, len(issues), SIGNATURE_BATCH):
+        hashes, lengths = _shingle_hashes(issues[batch_start:batch_start + SIGNATURE_BATCH], shingle_size)
+        nonempty = np.flatnonzero(lengths)
+        if len(nonempty) == 0:
+            continue
+        starts = np.concatenate(([0], np.cumsum(lengths[nonempty])[:-1]))
+        permuted = np.empty_like(hashes)
+        for p in range(num_perm):
+            np.multiply(hashes, a[p], out=permuted)
+            permuted += b[p]
+            permuted >>= shift
+            signatures[batch_start + nonempty, p] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def cached_signatures(store, rows, num_perm: int = 64, shingle_size: int = 3, seed: int = 0) -> np.ndarray:
+    """minhash_signatures for IssueStore rows, computed once per export version and kept with its index"""
+    return store.derived_rows(
+        f"minhash-{num_perm}-{shingle_size}-{seed}", rows, num_perm, np.uint32,
+        lambda issues: minhash_signatures(issues, num_perm, shingle_size, seed),
+    )
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_duplicate_groups(issues: List[Dict], threshold: float = 0.7, num_perm: int = 64,
+                          bands: int = 16, seed: int = 0,
+                          signatures: Optional[np.ndarray] = None) -> List[DuplicateGroup]:
+    """
+    Group near-duplicate issues (estimated Jaccard similarity >= threshold).
+
+    Signatures are split into bands; issues sharing a band bucket are
+    candidates and are checked against the bucket's first member before
+    being merged with union-find. Returns only groups of two or more,
+    largest first. The representative is the most-discussed member
+    (lowest issue number on ties). Precomputed signatures (one row per
+    issue, e.g. from cached_signatures) skip the MinHash pass.
+    """
+    n = len(issues)
+    if n < 2:
+        return []
+    if signatures is None:
+        signatures = minhash_signatures(issues, num_perm, seed=seed)
+    num_perm = signatures.shape[1]
+    rows_per_band = max(1, num_perm // bands)
+    searchable = np.flatnonzero(signatures[:, 0] != EMPTY_SLOT)
+
+    parent = list(range(n))
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[searchable, band * rows_per_band:(band + 1) * rows_per_band])
+        if block.shape[1] == 0:
+            break
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * block.shape[1]))).ravel()
+        _, bucket = np.unique(keys, return_inverse=True)
+        order = np.argsort(bucket, kind="stable")
+        sorted_buckets = bucket[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+        first = order[group_start[np.searchsorted(sorted_buckets[group_start], sorted_buckets)]]
+
+        candidates = order != first
+        if not candidates.any():
+            continue
+        members, leaders = searchable[order[candidates]], searchable[first[candidates]]
+        similarity = (signatures[members] == signatures[leaders]).mean(axis=1)
+        for i, j in zip(members[similarity >= threshold], leaders[similarity >= threshold]):
+            root_i, root_j = _find(parent, int(i)), _find(parent, int(j))
+            if root_i != root_j:
+                parent[root_i] = root_j
+
+    grouped: Dict[int, List[int]] = {}
+    for i in range(n):
+        grouped.setdefault(_find(parent, i), []).append(i)
+
+    groups = []
+    for indices in grouped.values():
+        if len(indices) < 2:
+            continue
+        members = [issues[i] for i in indices]
+        representative = max(
+            members, key=lambda issue: (int(issue.get("comments") or 0), -int(issue.get("number") or 0))
+        )
+        groups.append(DuplicateGroup(representative, members))
+    groups.sort(key=lambda g: g.size, reverse=True)
+    return groups
+
+
+def collapse_duplicates(issues: List[Dict], threshold: float = 0.7, **kwargs) -> Tuple[List[Dict], Dict]:
+    """
+    Keep one representative per near-duplicate group, in the original order.
+
+    Representatives are copies carrying "duplicates" (how many other
+    reports they stand for) and "duplicate_numbers". Returns (issues, stats).
+    """
+    groups = find_duplicate_groups(issues, threshold, **kwargs)
+    dropped = set()
+    extra = {}
+    for group in groups:
+        extra[id(group.representative)] = group
+        dropped.update(id(m) for m in group.members if m is not group.representative)
+
+    collapsed = []
+    for issue in issues:
+        if id(issue) in dropped:
+            continue
+        group = extra.get(id(issue))
+        if group is not None:
+            issue = dict(issue, duplicates=group.size - 1, duplicate_numbers=group.duplicate_numbers)
+        collapsed.append(issue)
+
+    stats = {
+        "issues_in": len(issues),
+        "issues_out": len(collapsed),
+        "groups": len(groups),
+        "duplicates_removed": len(dropped),
+        "largest_group": groups[0].size if groups else 1,
+    }
+    return collapsed, stats
@@ -0,0 +1,105 @@
+"""
+Issue Ingest - incremental analysis state for the GitHub issue analyzer
+Persists a watermark, per-issue content hashes and per-category summaries
+so each run only sends new or updated issues to the model
+"""
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from issue_store import parse_timestamp
+
+
+@dataclass
+class IngestState:
+    """What the analyzer knew at the end of its last run"""
+    watermark_number: int = 0
+    watermark_created_at: int = 0
+    issue_hashes: Dict[str, str] = field(default_factory=dict)
+    category_summaries: List[Dict] = field(default_factory=list)
+    report: str = ""
+    issues_analyzed: int = 0
+    updated_at: float = 0.0
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.category_summaries
+
+
+def state_path_for(source: Path, filters: Dict = None) -> Path:
+    """One state file per (export, filter set), in a sidecar directory next to the export"""
+    key = hashlib.sha256(json.dumps(filters or {}, sort_keys=True, default=str).encode()).hexdigest()[:12]
+    return source.parent / f".{source.name}.analysis" / f"state-{key}.json"
+
+
+def load_state(path: Path) -> IngestState:
+    try:
+        return IngestState(**json.loads(path.read_text()))
+    except (OSError, ValueError, TypeError):
+        return IngestState()
+
+
+def save_state(state: IngestState, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".tmp-{os.getpid()}")
+    tmp.write_text(json.dumps(asdict(state)))
+    os.replace(tmp, path)
+
+
+def issue_hash(issue: Dict) -> str:
+    """Hash of the fields that matter for analysis (ignores url and comment count churn)"""
+    relevant = {k: issue.get(k) for k in ("title", "body", "state", "labels")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def find_delta(issues: List[Dict], state: IngestState) -> Tuple[List[Dict], List[Dict]]:
+    """Split issues into (new, updated) relative to the saved state"""
+    new, updated = [], []
+    for issue in issues:
+        number = str(issue.get("number"))
+        previous = state.issue_hashes.get(number)
+        if previous is None:
+            new.append(issue)
+        elif previous != issue_hash(issue):
+            updated.append(issue)
+    return new, updated
+
+
+def advance_state(state: IngestState, delta: List[Dict], category_summaries: List[Dict], report: str) -> IngestState:
+    """Fold a successfully analyzed delta into the state"""
+    for issue in delta:
+        state.issue_hashes[str(issue.get("number"))] = issue_hash(issue)
+        state.watermark_number = max(state.watermark_number, int(issue.get("number") or 0))
+        state.watermark_created_at = max(state.watermark_created_at, parse_timestamp(issue.get("created_at")))
+    state.category_summaries = category_summaries
+    state.report = report
+    state.issues_analyzed = len(state.issue_hashes)
+    state.updated_at = time.time()
+    return state
+
+
+def split_report_and_summaries(reply: str) -> Tuple[str, List[Dict]]:
+    """
+    Separate the Markdown report from the trailing ```json category summaries block.
+
+    Returns (report, summaries); summaries is empty if the block is missing
+    or malformed.
+    """
+    marker = reply.rfind("```json")
+    if marker == -1:
+        return reply.strip(), []
+    block = reply[marker + len("```json"):]
+    block = block.split("```", 1)[0]
+    try:
+        data = json.loads(block)
+    except ValueError:
+        return reply.strip(), []
+    categories = data.get("categories", []) if isinstance(data, dict) else data
+    if not isinstance(categories, list):
+        return reply.strip(), []
+    return reply[:marker].strip(), [c for c in categories if isinstance(c, dict)]
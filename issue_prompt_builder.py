@@ -0,0 +1,198 @@
+"""
+Issue Prompt Builder - token-budget aware serialization of GitHub issues
+Picks the most compact encoding that fits a token budget and sizes
+max_tokens from what is left of the model's context window
+"""
+
+import json
+from typing import List, Dict, Tuple
+
+# Approximate context windows / output caps for Model Studio models
+MODEL_CONTEXT_TOKENS = {
+    "qwen-max": 32768,
+    "qwen-plus": 131072,
+    "qwen-turbo": 131072,
+}
+MODEL_MAX_OUTPUT_TOKENS = {
+    "qwen-max": 8192,
+    "qwen-plus": 8192,
+    "qwen-turbo": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 32768
+DEFAULT_MAX_OUTPUT_TOKENS = 8000
+CONTEXT_SAFETY_MARGIN = 512
+
+DEFAULT_ISSUE_TOKEN_BUDGET = 6000
+
+# Fields the model never needs (the issue number already identifies it; duplicate counts are kept)
+DROPPED_FIELDS = ("url", "duplicate_numbers")
+
+# Encodings tried in order, from most to least faithful: (format, body chars)
+ENCODING_LADDER = [
+    ("json", None),
+    ("table", None),
+    ("table", 600),
+    ("table", 300),
+    ("table", 150),
+    ("table", 60),
+    ("table", 0),
+]
+
+TABLE_COLUMNS = "number|state|labels|comments|created|title|body"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate.
+
+    Roughly 4 characters per token for ASCII text; non-ASCII characters
+    (CJK, emoji) are counted as a token each.
+    """
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def truncate_text(text: str, limit) -> str:
+    """Collapse whitespace and cut text to limit chars (None keeps everything)"""
+    text = " ".join((text or "").split())
+    if limit is None or len(text) <= limit:
+        return text
+    if limit == 0:
+        return ""
+    return text[:limit].rstrip() + "…"
+
+
+def _compact_issue(issue: Dict, body_chars=None) -> Dict:
+    compact = {k: v for k, v in issue.items() if k not in DROPPED_FIELDS}
+    if "body" in compact:
+        compact["body"] = truncate_text(compact["body"], body_chars)
+        if not compact["body"]:
+            del compact["body"]
+    if "created_at" in compact:
+        compact["created_at"] = str(compact["created_at"])[:10]
+    return compact
+
+
+def _duplicate_marker(issue: Dict) -> str:
+    duplicates = int(issue.get("duplicates") or 0)
+    return f"[+{duplicates} dups] " if duplicates else ""
+
+
+def report_count(issues: List[Dict]) -> int:
+    """Number of reports the issues stand for, counting collapsed near-duplicates"""
+    return sum(1 + int(issue.get("duplicates") or 0) for issue in issues)
+
+
+def serialize_issues(issues: List[Dict], fmt: str = "json", body_chars=None) -> str:
+    """Serialize issues as minified JSON or a pipe-delimited table"""
+    if fmt == "json":
+        return json.dumps(
+            [_compact_issue(issue, body_chars) for issue in issues],
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+
+    rows = [TABLE_COLUMNS]
+    for issue in issues:
+        cells = [
+            str(issue.get("number", "")),
+            str(issue.get("state", "")),
+            ",".join(issue.get("labels", []) or []),
+            str(issue.get("comments", "")),
+            str(issue.get("created_at", ""))[:10],
+            _duplicate_marker(issue) + truncate_text(issue.get("title", ""), None),
+            truncate_text(issue.get("body", ""), body_chars),
+        ]
+        rows.append("|".join(cell.replace("|", "/") for cell in cells))
+    return "\n".join(rows)
+
+
+def build_issue_payload(issues: List[Dict], token_budget: int = DEFAULT_ISSUE_TOKEN_BUDGET) -> Tuple[str, Dict]:
+    """
+    Serialize issues into the most faithful encoding that fits token_budget.
+
+    Walks ENCODING_LADDER and, if even the leanest encoding is too large,
+    drops issues from the end of the list. Returns (text, stats).
+    """
+    baseline_tokens = estimate_tokens(json.dumps(issues, indent=2))
+
+    text, fmt, body_chars, kept = "", "table", 0, list(issues)
+    for fmt, body_chars in ENCODING_LADDER:
+        text = serialize_issues(kept, fmt, body_chars)
+        if estimate_tokens(text) <= token_budget:
+            break
+    else:
+        while len(kept) > 1 and estimate_tokens(text) > token_budget:
+            kept = kept[:max(1, int(len(kept) * 0.9))]
+            text = serialize_issues(kept, fmt, body_chars)
+
+    tokens = estimate_tokens(text)
+    stats = {
+        "format": fmt,
+        "body_chars": body_chars,
+        "issues_included": len(kept),
+        "issues_dropped": len(issues) - len(kept),
+        "baseline_tokens": baseline_tokens,
+        "tokens": tokens,
+        "tokens_saved": max(0, baseline_tokens - tokens),
+    }
+    return text, stats
+
+
+def describe_savings(stats: Dict) -> str:
+    """One-line summary of the encoding and tokens saved versus pretty-printed JSON, for the UI"""
+    if stats["body_chars"] is None:
+        body = "full bodies"
+    else:
+        body = f"bodies ≤{stats['body_chars']} chars" if stats["body_chars"] else "no bodies"
+    saved = 100.0 * stats["tokens_saved"] / stats["baseline_tokens"] if stats["baseline_tokens"] else 0.0
+    note = (
+        f"{stats['issues_included']:,} issues as {stats['format']} ({body}), ~{stats['tokens']:,} tokens "
+        f"vs ~{stats['baseline_tokens']:,} pretty JSON (saved ~{stats['tokens_saved']:,}, {saved:.0f}%)"
+    )
+    if stats["issues_dropped"]:
+        note += f"; {stats['issues_dropped']:,} dropped to fit the budget"
+    return note
+
+
+def format_description(stats: Dict) -> str:
+    """Human-readable description of the encoding, for the prompt"""
+    if stats["format"] == "json":
+        return "minified JSON (url field omitted)"
+    note = f"pipe-delimited rows with columns `{TABLE_COLUMNS}`"
+    if stats["body_chars"] is not None:
+        note += f"; bodies truncated to {stats['body_chars']} chars" if stats["body_chars"] else "; bodies omitted"
+    return note
+
+
+def compute_max_tokens(model: str, prompt_tokens: int) -> int:
+    """Size max_tokens from the context left after the prompt, capped by the model's output limit"""
+    context = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    output_cap = MODEL_MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS)
+    remaining = context - prompt_tokens - CONTEXT_SAFETY_MARGIN
+    return max(256, min(output_cap, remaining))
+
+
+def shard_issues(issues: List[Dict], shard_token_budget: int = DEFAULT_ISSUE_TOKEN_BUDGET,
+                 body_chars: int = 300) -> List[List[Dict]]:
+    """
+    Split issues into batches whose table encoding fits shard_token_budget.
+
+    Rows are measured with the same encoding serialize_issues uses, so a
+    shard's payload stays within budget (a single oversized issue still
+    gets a shard of its own).
+    """
+    header_tokens = estimate_tokens(TABLE_COLUMNS)
+    shards: List[List[Dict]] = []
+    current: List[Dict] = []
+    current_tokens = header_tokens
+    for issue in issues:
+        row_tokens = estimate_tokens(serialize_issues([issue], "table", body_chars)) - header_tokens
+        if current and current_tokens + row_tokens > shard_token_budget:
+            shards.append(current)
+            current, current_tokens = [], header_tokens
+        current.append(issue)
+        current_tokens += row_tokens
+    if current:
+        shards.append(current)
+    return shards
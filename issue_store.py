@@ -0,0 +1,320 @@
+"""
+Issue Store - streaming loader and columnar index for GitHub issue exports
+Streams large JSON / JSONL exports once, then serves filtered slices
+(state, labels, date range, issue number) from memory-mapped columns
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+INDEX_VERSION = 1
+READ_CHUNK_SIZE = 1 << 20
+
+# Columns stored as one .npy file each and opened with mmap_mode="r"
+COLUMNS = ("number", "state", "created_at", "comments", "offset", "length", "label_rows", "label_ids")
+
+
+def _iter_json_array(f, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+    """Yield the elements of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buf, pos = "", 0
+    started = eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("Expected a JSON array of issues")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+                yield obj
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            return
+
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+
+def iter_issues(path: Union[str, Path]) -> Iterator[Dict]:
+    """Stream issues from a JSON array or JSON Lines file"""
+    with open(path, "r", encoding="utf-8") as f:
+        first = ""
+        while True:
+            ch = f.read(1)
+            if not ch or not ch.isspace():
+                first = ch
+                break
+        f.seek(0)
+        if first == "[":
+            yield from _iter_json_array(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def source_signature(path: Union[str, Path]) -> Dict:
+    """Size, mtime and index version of an export - the index is rebuilt when this changes"""
+    stat = Path(path).stat()
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "version": INDEX_VERSION}
+
+
+def default_index_dir(source: Union[str, Path]) -> Path:
+    """
+    Sidecar directory next to the export, or a per-user cache directory when that isn't writable.
+
+    Cache directories ($XDG_CACHE_HOME or ~/.cache, else the temp directory)
+    are keyed by a hash of the export's absolute path.
+    """
+    source = Path(source).resolve()
+    if os.access(source.parent, os.W_OK):
+        return source.parent / f".{source.name}.index"
+    key = f"{source.name}-{hashlib.sha256(str(source).encode('utf-8')).hexdigest()[:16]}"
+    for root in (Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"), Path(tempfile.gettempdir())):
+        cache_dir = root / "qwen-issue-index"
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(cache_dir, os.W_OK):
+            return cache_dir / key
+    return source.parent / f".{source.name}.index"
+
+
+def parse_timestamp(value) -> int:
+    """ISO-8601 created_at -> epoch seconds (0 when missing or invalid)"""
+    if not value:
+        return 0
+    try:
+        return int(datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return 0
+
+
+class IssueStore:
+    """
+    Read-only, process-wide view over an issue export.
+
+    The first open streams the source into a compact JSON Lines record file
+    plus one .npy file per column in an index directory (next to the export,
+    or in a cache directory if the export's is read-only). Later opens
+    memory-map the columns, so filters are vectorized NumPy operations and
+    only the matching records are ever parsed.
+    """
+
+    def __init__(self, source: Union[str, Path], index_dir: Optional[Union[str, Path]] = None):
+        self.source = Path(source)
+        self.index_dir = Path(index_dir) if index_dir else default_index_dir(self.source)
+        self._records = None
+        self._records_file = None
+        self._derived: Dict[str, tuple] = {}
+        self._derived_lock = threading.Lock()
+        self._open_index()
+
+    # Index lifecycle -----------------------------------------------------
+
+    def is_stale(self) -> bool:
+        meta_path = self.index_dir / "meta.json"
+        if not meta_path.exists():
+            return True
+        try:
+            meta = json.loads(meta_path.read_text())
+        except ValueError:
+            return True
+        return meta.get("source") != source_signature(self.source)
+
+
+    def _open_index(self):
+        if self.is_stale():
+            self._build_index()
+        meta = json.loads((self.index_dir / "meta.json").read_text())
+        self.labels: List[str] = meta["labels"]
+        self.states: List[str] = meta["states"]
+        self.columns = {
+            name: np.load(self.index_dir / f"{name}.npy", mmap_mode="r") for name in COLUMNS
+        }
+        # Sorted issue numbers for O(log n) lookup by number
+        self._number_order = np.argsort(self.columns["number"], kind="stable")
+        self._sorted_numbers = np.asarray(self.columns["number"])[self._number_order]
+
+        self._records_file = open(self.index_dir / "records.jsonl", "rb")
+        size = os.fstat(self._records_file.fileno()).st_size
+        self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def _build_index(self):
+        tmp_dir = self.index_dir.with_name(f"{self.index_dir.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        label_codes: Dict[str, int] = {}
+        state_codes: Dict[str, int] = {}
+        cols = {name: [] for name in COLUMNS}
+        offset = 0
+        with open(tmp_dir / "records.jsonl", "wb") as out:
+            for row, issue in enumerate(iter_issues(self.source)):
+                record = json.dumps(issue, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+                out.write(record)
+                cols["number"].append(int(issue.get("number") or 0))
+                cols["state"].append(state_codes.setdefault(str(issue.get("state", "unknown")), len(state_codes)))
+                cols["created_at"].append(parse_timestamp(issue.get("created_at")))
+                cols["comments"].append(int(issue.get("comments") or 0))
+                cols["offset"].append(offset)
+                cols["length"].append(len(record))
+                for label in issue.get("labels", []) or []:
+                    cols["label_rows"].append(row)
+                    cols["label_ids"].append(label_codes.setdefault(str(label), len(label_codes)))
+                offset += len(record)
+
+        dtypes = {
+            "number": np.int64, "state": np.uint8, "created_at": np.int64, "comments": np.int32,
+            "offset": np.int64, "length": np.int32, "label_rows": np.int32, "label_ids": np.int32,
+        }
+        for name in COLUMNS:
+            np.save(tmp_dir / f"{name}.npy", np.asarray(cols[name], dtype=dtypes[name]))
+
+        meta = {
+            "source": source_signature(self.source),
+            "count": len(cols["number"]),
+            "labels": sorted(label_codes, key=label_codes.get),
+            "states": sorted(state_codes, key=state_codes.get),
+        }
+        (tmp_dir / "meta.json").write_text(json.dumps(meta))
+
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.index_dir)
+
+    def _open_derived(self, name: str, width: int, dtype) -> tuple:
+        """(values, done) memory-mapped read-write, created zero-filled on first use"""
+        if name not in self._derived:
+            paths = self.index_dir / f"{name}.npy", self.index_dir / f"{name}.done.npy"
+            for path, shape, kind in zip(paths, ((len(self), width), (len(self),)), (dtype, np.uint8)):
+                if not path.exists():
+                    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+                    np.lib.format.open_memmap(tmp, mode="w+", dtype=kind, shape=shape).flush()
+                    os.replace(tmp, path)
+            self._derived[name] = tuple(np.load(path, mmap_mode="r+") for path in paths)
+        return self._derived[name]
+
+    def derived_rows(self, name: str, rows: Sequence[int], width: int, dtype,
+                     compute: Callable[[List[Dict]], np.ndarray]) -> np.ndarray:
+        """
+        Per-row derived data (e.g. MinHash signatures) for rows, computed at most once per export version.
+
+        Values live in the index directory as memory-mapped arrays next to a
+        per-row done flag; compute(issues) -> (len(issues), width) only runs
+        for rows not seen before. A rebuilt index starts empty.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return np.zeros((0, width), dtype=dtype)
+        with self._derived_lock:
+            try:
+                values, done = self._open_derived(name, width, dtype)
+            except OSError:
+                return np.asarray(compute(self.get(rows)), dtype=dtype)
+            missing = rows[done[rows] == 0]
+            if len(missing):
+                values[missing] = compute(self.get(missing))
+                values.flush()
+                done[missing] = 1
+                done.flush()
+            return np.array(values[rows])
+
+    def close(self):
+        self._derived = {}
+        if self._records is not None and not isinstance(self._records, bytes):
+            self._records.close()
+        if self._records_file is not None:
+            self._records_file.close()
+        self._records = self._records_file = None
+
+    # Queries -------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.columns["number"])
+
+    def filter(self, state: Optional[str] = None, labels: Optional[Sequence[str]] = None,
+               since: Optional[Union[int, datetime]] = None, until: Optional[Union[int, datetime]] = None,
+               since_days: Optional[float] = None, limit: Optional[int] = None,
+               newest_first: bool = True) -> np.ndarray:
+        """
+        Row ids matching all given filters, ordered by created_at.
+
+        labels matches issues carrying ANY of the given labels; since/until
+        accept epoch seconds or datetimes; since_days is relative to now.
+        """
+        n = len(self)
+        mask = np.ones(n, dtype=bool)
+
+        if state:
+            if state not in self.states:
+                return np.zeros(0, dtype=np.int64)
+            mask &= np.asarray(self.columns["state"]) == self.states.index(state)
+
+        if labels:
+            wanted = [self.labels.index(label) for label in labels if label in self.labels]
+            has_label = np.zeros(n, dtype=bool)
+            if wanted:
+                hits = np.isin(self.columns["label_ids"], wanted)
+                has_label[np.asarray(self.columns["label_rows"])[hits]] = True
+            mask &= has_label
+
+        if since_days:
+            since = int(time.time() - since_days * 86400)
+        created = np.asarray(self.columns["created_at"])
+        if since is not None:
+            mask &= created >= (int(since.timestamp()) if isinstance(since, datetime) else since)
+        if until is not None:
+            mask &= created <= (int(until.timestamp()) if isinstance(until, datetime) else until)
+
+        rows = np.flatnonzero(mask)
+        order = np.argsort(created[rows], kind="stable")
+        if newest_first:
+            order = order[::-1]
+        rows = rows[order]
+        return rows[:limit] if limit is not None else rows
+
+    def get(self, rows: Sequence[int]) -> List[Dict]:
+        """Parse the records for the given row ids"""
+        offsets, lengths = self.columns["offset"], self.columns["length"]
+        return [
+            json.loads(self._records[int(offsets[r]):int(offsets[r]) + int(lengths[r])])
+            for r in rows
+        ]
+
+    def by_number(self, number: int) -> Optional[Dict]:
+        pos = int(np.searchsorted(self._sorted_numbers, number))
+        if pos < len(self._sorted_numbers) and self._sorted_numbers[pos] == number:
+            return self.get([self._number_order[pos]])[0]
+        return None
+
+    def query(self, limit: Optional[int] = None, **filters) -> List[Dict]:
+        """filter() + get() in one call"""
+        return self.get(self.filter(limit=limit, **filters))
+
+    def label_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.columns["label_ids"], minlength=len(self.labels))
+        return {label: int(count) for label, count in zip(self.labels, counts)}
@@ -0,0 +1,130 @@
+"""
+Pipeline - tiny dependency-driven stage runner with timing
+Stages run on a thread pool as soon as their dependencies finish; status
+callbacks fire on the calling thread so they can safely update Streamlit
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tracing import propagate, span
+
+
+@dataclass
+class Stage:
+    """One unit of work; func(results) returns (value, detail) where results maps stage name -> value"""
+    name: str
+    label: str
+    func: Callable[[Dict[str, Any]], Tuple[Any, str]]
+    deps: Tuple[str, ...] = ()
+
+
+@dataclass
+class StageResult:
+    name: str
+    label: str
+    status: str = "pending"  # pending, running, done, failed, skipped
+    started: float = 0.0
+    finished: float = 0.0
+    detail: str = ""
+    value: Any = None
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.finished - self.started) if self.finished else 0.0
+
+
+@dataclass
+class PipelineRun:
+    results: Dict[str, StageResult] = field(default_factory=dict)
+    started: float = 0.0
+    finished: float = 0.0
+
+    @property
+    def wall_time(self) -> float:
+        return self.finished - self.started
+
+    @property
+    def ok(self) -> bool:
+        return all(r.status == "done" for r in self.results.values())
+
+    def value(self, name: str) -> Any:
+        return self.results[name].value
+
+    def error(self) -> Optional[str]:
+        failed = [r for r in self.results.values() if r.status == "failed"]
+        return failed[0].detail if failed else None
+
+    def timing_table(self) -> str:
+        """Markdown breakdown of where the time went"""
+        rows = ["| Stage | Status | Start (s) | Duration (s) | Detail |", "|---|---|---|---|---|"]
+        icons = {"done": "✅", "failed": "❌", "skipped": "⏭️", "pending": "⏸️", "running": "🔄"}
+        for r in sorted(self.results.values(), key=lambda r: (r.started or float("inf"), r.name)):
+            start = f"{r.started - self.started:.2f}" if r.started else "-"
+            rows.append(f"| {r.label} | {icons[r.status]} | {start} | {r.duration:.2f} | {r.detail} |")
+        busy = sum(r.duration for r in self.results.values())
+        rows.append(f"| **Total (wall clock)** | | | **{self.wall_time:.2f}** | sum of stages {busy:.2f}s |")
+        return "\n".join(rows)
+
+
+def _run_stage(stage: Stage, values: Dict[str, Any]) -> Tuple[Any, str]:
+    with span(f"stage.{stage.name}") as stage_span:
+        value, detail = stage.func(values)
+        stage_span.set(detail=detail)
+        return value, detail
+
+
+def run_pipeline(stages: List[Stage], on_update: Callable[[StageResult], None] = None,
+                 max_workers: int = 4) -> PipelineRun:
+    """
+    Run stages respecting dependencies, concurrently where possible.
+
+    A failing stage marks everything downstream of it as skipped;
+    independent branches still finish.
+    """
+    run = PipelineRun(results={s.name: StageResult(s.name, s.label) for s in stages}, started=time.monotonic())
+    notify = on_update or (lambda result: None)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while True:
+            for stage in stages:
+                result = run.results[stage.name]
+                if result.status != "pending":
+                    continue
+                dep_states = [run.results[d].status for d in stage.deps]
+                if any(state in ("failed", "skipped") for state in dep_states):
+                    result.status = "skipped"
+                    result.detail = "upstream stage failed"
+                    notify(result)
+                elif all(state == "done" for state in dep_states):
+                    result.status = "running"
+                    result.started = time.monotonic()
+                    notify(result)
+                    values = {name: r.value for name, r in run.results.items() if r.status == "done"}
+                    running[executor.submit(propagate(_run_stage), stage, values)] = stage.name
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = run.results[running.pop(future)]
+                result.finished = time.monotonic()
+                try:
+                    result.value, result.detail = future.result()
+                    result.status = "done"
+                except Exception as e:
+                    result.status = "failed"
+                    result.detail = str(e)
+                notify(result)
+
+    for result in run.results.values():
+        if result.status == "pending":
+            result.status = "skipped"
+            result.detail = "upstream stage failed"
+            notify(result)
+
+    run.finished = time.monotonic()
+    return run
@@ -6,9 +6,28 @@ Simulates agent behavior with real analysis
 import streamlit as st
 import requests
 import json
-import time
 import os
+import time
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from issue_prompt_builder import (
+    DEFAULT_ISSUE_TOKEN_BUDGET, TABLE_COLUMNS, build_issue_payload, format_description, describe_savings,
+    estimate_tokens, compute_max_tokens, serialize_issues, shard_issues, report_count
+)
+from issue_clustering import cluster_issues, build_cluster_payload
+from issue_dedup import cached_signatures, collapse_duplicates
+from issue_store import IssueStore, source_signature
+from dashscope_client import (
+    chat_completion, hedged_chat_completion, warm_up_connection,
+    HedgePolicy, INTERACTIVE, BATCH
+)
+from pipeline import Stage, run_pipeline
+from tracing import propagate, span, trace
+from ui_panels import get_history, show_history_sidebar, show_rate_limiter_panel, show_trace_panel
+from issue_ingest import (
+    load_state, save_state, state_path_for, find_delta, advance_state, split_report_and_summaries
+)
 
 # Page config
 st.set_page_config(
@@ -67,6 +86,10 @@ if 'agent_result' not in st.session_state:
     st.session_state.agent_result = None
 if 'api_tested' not in st.session_state:
     st.session_state.api_tested = False
+if 'agent_timings' not in st.session_state:
+    st.session_state.agent_timings = None
+if 'agent_trace' not in st.session_state:
+    st.session_state.agent_trace = None
 
 def test_api_key(api_key: str) -> tuple:
     """Test API key"""
@@ -87,28 +110,75 @@ def test_api_key(api_key: str) -> tuple:
     except Exception as e:
         return False, f"❌ Error: {str(e)}"
 
-def simulate_agent_step(step_text: str, duration: float = 1.0):
-    """Simulate an agent step with visual feedback"""
-    step_placeholder = st.empty()
-    # Show loading state
-    step_placeholder.info(f"🔄 {step_text}")
-    time.sleep(duration)
-    # Show completed state
-    step_placeholder.success(f"✅ {step_text}")
-    return step_placeholder
-
-def analyze_github_issues(api_key: str, model: str = "qwen-max") -> str:
+ANALYSIS_REQUIREMENTS = """## 1. Category Breakdown
+Categorize all issues and show:
+- Category name
+- Number of issues in each category
+- Severity distribution (critical/high/medium)
+
+## 2. Top Pain Points (by frequency)
+List the top 5-7 pain points across all issues:
+- What is the problem?
+- How many issues relate to it?
+- Why is it problematic?
+
+## 3. Root Cause Analysis
+Identify architectural issues:
+- What design patterns are causing problems?
+- Which components have the most issues?
+- Are there systemic problems?
+
+## 4. Proposed Architectural Solutions
+For each major pain point, propose solutions that:
+- Fit LangChain's existing architecture
+- Can be implemented incrementally
+- Address multiple related issues
+- Include specific technical approaches (with code examples where helpful)
+
+## 5. Implementation Priority
+Rank solutions by:
+- Impact (how many issues fixed)
+- Effort required
+- Risk level
+
+**Be specific, actionable, and technical. Think like a senior architect.**"""
+
+# Newest issues (or duplicate-group representatives) sent by a single-shot run without pre-clustering
+SINGLE_SHOT_ISSUES = 50
+
+ANALYST_SYSTEM_PROMPT = "You are a senior software architect and GitHub repository analyst. You excel at pattern recognition, root cause analysis, and proposing systemic solutions."
+
+# Map-reduce settings for large issue sets
+MAP_SHARD_TOKEN_BUDGET = 6000
+MAP_MAX_TOKENS = 1500
+MAX_REDUCE_PAIN_POINTS = 60
+
+TRACE_FILE_NAME = "qwen_agent_trace.json"
+
+@st.cache_resource(show_spinner="📇 Indexing issues...", max_entries=4)
+def get_issue_store(path: str, signature: tuple) -> IssueStore:
+    """
+    Open (building on first use) the issue index - once per process and export version.
+
+    signature is part of the cache key, so a changed export gets a new store
+    while sessions still holding the old one keep reading it undisturbed.
+    """
+    return IssueStore(path)
+
+def find_issue_store() -> tuple:
     """
-    Analyze GitHub issues using Qwen with simulated agent behavior
+    Locate the issues export and open its store, trying multiple paths.
+
+    Returns (store, None) on success or (None, error_message).
     """
     
     # Get the directory where this script is located
     script_dir = Path(__file__).parent if '__file__' in globals() else Path.cwd()
     
-    # Load the pre-fetched issues - try multiple paths
-    issues_data = None
+    # Locate the pre-fetched issues - try multiple paths
     possible_paths = [
         script_dir / 'langchain_issues.json',  # Same directory as script
+        script_dir / 'langchain_issues.jsonl',  # JSON Lines export
         Path.cwd() / 'langchain_issues.json',  # Current working directory
         Path('langchain_issues.json'),  # Relative path
         Path('/mnt/user-data/outputs/langchain_issues.json'),  # Absolute fallback
@@ -116,17 +186,19 @@ def analyze_github_issues(api_key: str, model: str = "qwen-max") -> str:
     
     error_messages = []
     for path in possible_paths:
+        if not path.is_file():
+            error_messages.append(f"{path}: not found")
+            continue
         try:
-            with open(path, 'r') as f:
-                issues_data = json.load(f)
-                break
+            resolved = path.resolve()
+            store = get_issue_store(str(resolved), tuple(sorted(source_signature(resolved).items())))
+            return store, None
         except Exception as e:
             error_messages.append(f"{path}: {str(e)}")
             continue
     
-    if not issues_data:
-        error_details = "\n".join(error_messages)
-        return f"""❌ Error: Could not load issues data.
+    error_details = "\n".join(error_messages)
+    return None, f"""❌ Error: Could not load issues data.
 
 Tried these locations:
 {error_details}
@@ -136,93 +208,435 @@ Please ensure langchain_issues.json is in the same directory as qwen_agent_demo.
 Current working directory: {Path.cwd()}
 Script directory: {script_dir}
 """
+
+def load_issues_data(limit: int = None, filters: dict = None) -> tuple:
+    """
+    Load a filtered slice of issues (newest first) from the indexed store.
+
+    Returns (issues, None) on success or (None, error_message).
+    """
+    store, error = find_issue_store()
+    if error:
+        return None, error
     
-    # Create analysis prompt
-    issues_text = json.dumps(issues_data[:50], indent=2)  # Use first 50 issues
+    issues_data = store.query(limit=limit, **(filters or {}))
+    if not issues_data:
+        return None, "❌ No issues match the selected filters."
+    return issues_data, None
+
+def call_qwen(messages: list, api_key: str, model: str, max_tokens: int, timeout: int = 120,
+              priority: int = INTERACTIVE, hedge: HedgePolicy = None) -> str:
+    """Send a chat request to Model Studio through the shared rate limiter (reply or ❌ error string)"""
+    if hedge:
+        reply, _ = hedged_chat_completion(
+            messages, api_key, model, max_tokens=max_tokens, timeout=timeout, priority=priority, policy=hedge
+        )
+        return reply
+    return chat_completion(messages, api_key, model, max_tokens=max_tokens, timeout=timeout, priority=priority)
+
+def prepare_issue_data(issues_data: list, token_budget: int, precluster: bool) -> tuple:
+    """
+    Turn issues into prompt-ready text.
+
+    Returns (issues_text, issue_count, data_description, payload_stats).
+    With precluster=True issues are clustered locally (TF-IDF + k-means)
+    and only cluster summaries with representative issues are kept
+    (payload_stats is then None).
+    """
+    if precluster:
+        clusters = cluster_issues(issues_data)
+        issues_text = build_cluster_payload(clusters, token_budget)
+        data_description = (
+            f"{len(clusters)} clusters pre-computed locally with TF-IDF + k-means; each line gives cluster size, "
+            "top terms, label counts, states and comment total, followed by its most representative issues"
+        )
+        return issues_text, report_count(issues_data), data_description, None
     
+    # Compact encoding sized to the token budget
+    issues_text, payload_stats = build_issue_payload(issues_data, token_budget)
+    data_description = format_description(payload_stats)
+    included = issues_data[:payload_stats["issues_included"]]
+    if any(issue.get("duplicates") for issue in included):
+        data_description += (
+            "; near-duplicate reports were collapsed locally - a `duplicates` count (or a `[+N dups]` title "
+            "prefix) means the issue stands for N+1 reports, so weight it accordingly when ranking by frequency"
+        )
+    return issues_text, report_count(included), data_description, payload_stats
+
+def build_analysis_messages(issues_text: str, issue_count: int, data_description: str) -> list:
+    """Chat messages for the single-shot issue analysis"""
     prompt = f"""You are an AI agent analyzing GitHub issues for the LangChain repository.
 
 **YOUR TASK:**
-Analyze these 50 GitHub issues and provide:
+Analyze these {issue_count} GitHub issues and provide:
 
 1. **Issue Categorization** - Group issues into logical categories
 2. **Common Pain Points** - Identify the most frequent and critical problems
 3. **Root Cause Analysis** - Explain what architectural patterns are causing these issues
 4. **Proposed Solutions** - Suggest specific architectural improvements that would address multiple issues
 
-**GITHUB ISSUES DATA:**
-```json
+**GITHUB ISSUES DATA** ({data_description}):
+```
 {issues_text}
 ```
 
 **ANALYSIS REQUIREMENTS:**
 
-## 1. Category Breakdown
-Categorize all issues and show:
-- Category name
-- Number of issues in each category
-- Severity distribution (critical/high/medium)
+{ANALYSIS_REQUIREMENTS}"""
 
-## 2. Top Pain Points (by frequency)
-List the top 5-7 pain points across all issues:
-- What is the problem?
-- How many issues relate to it?
-- Why is it problematic?
+    return [
+        {"role": "system", "content": ANALYST_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
-## 3. Root Cause Analysis
-Identify architectural issues:
-- What design patterns are causing problems?
-- Which components have the most issues?
-- Are there systemic problems?
+REPORT_SECTIONS = ("Category Breakdown", "Pain Points", "Root Cause", "Solutions", "Priority")
 
-## 4. Proposed Architectural Solutions
-For each major pain point, propose solutions that:
-- Fit LangChain's existing architecture
-- Can be implemented incrementally
-- Address multiple related issues
-- Include specific technical approaches (with code examples where helpful)
+def build_analysis_pipeline(store: IssueStore, api_key: str, model: str, token_budget: int, precluster: bool,
+                            filters: dict, hedge: HedgePolicy = None, dedupe: bool = False) -> list:
+    """
+    The single-shot analysis as real pipeline stages.
 
-## 5. Implementation Priority
-Rank solutions by:
-- Impact (how many issues fixed)
-- Effort required
-- Risk level
+    The DashScope connection is warmed up concurrently with the local
+    load -> filter -> (dedupe ->) pre-process -> prompt chain; the model
+    call waits for both. Stages run on pool threads without a Streamlit
+    script context, so the store comes from find_issue_store() on the
+    script thread.
+    """
+    def connect(results):
+        return None, f"TLS connection ready in {warm_up_connection():.2f}s"
 
-**Be specific, actionable, and technical. Think like a senior architect.**"""
+    def load(results):
+        return store, f"{len(store):,} issues indexed from {store.source.name}"
+
+    def filter_issues(results):
+        store = results["load"]
+        rows = store.filter(**(filters or {}))
+        if len(rows) == 0:
+            raise ValueError("No issues match the selected filters.")
+        # Dedupe sees every match so duplicate counts cover the whole backlog, not just the newest issues
+        selected = rows if precluster or dedupe else rows[:SINGLE_SHOT_ISSUES]
+        return (selected, store.get(selected)), f"{len(rows):,} match, using {len(selected):,}"
+
+    def collapse(results):
+        rows, issues = results["filter"]
+        issues, stats = collapse_duplicates(issues, signatures=cached_signatures(store, rows))
+        kept = issues if precluster else issues[:SINGLE_SHOT_ISSUES]
+        return kept, (
+            f"{stats['issues_in']:,} → {stats['issues_out']:,} issues, {stats['duplicates_removed']:,} duplicates "
+            f"in {stats['groups']:,} groups (largest {stats['largest_group']})"
+            + ("" if precluster else f", using the newest {len(kept):,}")
+        )
+
+    def preprocess(results):
+        issues = results["dedupe"] if dedupe else results["filter"][1]
+        issues_text, issue_count, data_description, payload_stats = prepare_issue_data(
+            issues, token_budget, precluster
+        )
+        if payload_stats:
+            detail = describe_savings(payload_stats)
+        else:
+            detail = f"~{estimate_tokens(issues_text):,} tokens of cluster summaries"
+        return (issues_text, issue_count, data_description), detail
+
+    def build_prompt(results):
+        messages = build_analysis_messages(*results["preprocess"])
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        max_tokens = compute_max_tokens(model, prompt_tokens)
+        return (messages, max_tokens), f"~{prompt_tokens:,} prompt tokens, max_tokens {max_tokens:,}"
+
+    def call_model(results):
+        messages, max_tokens = results["prompt"]
+        if hedge:
+            reply, served_by = hedged_chat_completion(messages, api_key, model, max_tokens=max_tokens, policy=hedge)
+        else:
+            reply, served_by = call_qwen(messages, api_key, model, max_tokens), model
+        if reply.startswith("❌"):
+            raise RuntimeError(reply)
+        return reply, f"{len(reply):,} characters from {served_by}"
+
+    def parse(results):
+        report = results["model"].strip()
+        found = sum(1 for section in REPORT_SECTIONS if section.lower() in report.lower())
+        return report, f"{found}/{len(REPORT_SECTIONS)} report sections, {len(report.split()):,} words"
+
+    stages = [
+        Stage("connect", "Connect to Model Studio", connect),
+        Stage("load", "Load issue index", load),
+        Stage("filter", "Filter issues", filter_issues, ("load",)),
+    ]
+    if dedupe:
+        stages.append(Stage("dedupe", "Collapse near-duplicates", collapse, ("filter",)))
+    return stages + [
+        Stage("preprocess", "Pre-process issues" + (" (clustering)" if precluster else ""), preprocess,
+              ("dedupe",) if dedupe else ("filter",)),
+        Stage("prompt", "Build prompt", build_prompt, ("preprocess",)),
+        Stage("model", f"Generate analysis with {model}", call_model, ("prompt", "connect")),
+        Stage("parse", "Parse response", parse, ("model",)),
+    ]
+
+def parse_json_reply(text: str) -> dict:
+    """Parse a JSON object from a model reply, tolerating ```json fences"""
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.split("\n", 1)[1] if "\n" in cleaned else ""
+        cleaned = cleaned.rsplit("```", 1)[0]
+    try:
+        start, end = cleaned.index("{"), cleaned.rindex("}")
+        return json.loads(cleaned[start:end + 1])
+    except ValueError:
+        return {}
+
+def map_issue_shard(shard: list, api_key: str, model: str) -> dict:
+    """Map step: produce a structured partial categorization for one shard of issues"""
+    issues_text = serialize_issues(shard, "table", body_chars=300)
+    prompt = f"""Categorize this batch of {len(shard)} LangChain GitHub issues.
+
+**ISSUES** (pipe-delimited rows with columns `{TABLE_COLUMNS}`):
+```
+{issues_text}
+```
 
+Reply with ONLY a JSON object in this exact shape:
+{{"categories": [{{"name": "...", "issue_numbers": [1, 2], "severity": {{"critical": 0, "high": 0, "medium": 0}}}}],
+ "pain_points": [{{"problem": "...", "issue_numbers": [1], "why": "..."}}],
+ "components": [{{"name": "...", "issue_numbers": [1]}}]}}
+
+Use short, general category names (e.g. "Memory", "Agents", "Retrieval", "Performance") so batches can be merged."""
     messages = [
-        {
-            "role": "system",
-            "content": "You are a senior software architect and GitHub repository analyst. You excel at pattern recognition, root cause analysis, and proposing systemic solutions."
-        },
+        {"role": "system", "content": ANALYST_SYSTEM_PROMPT},
         {"role": "user", "content": prompt}
     ]
-    
-    url = "https://dashscope-intl.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "model": model,
-        "input": {"messages": messages},
-        "parameters": {
-            "result_format": "message",
-            "max_tokens": 8000,
-            "temperature": 0.3
-        }
+    reply = call_qwen(messages, api_key, model, MAP_MAX_TOKENS, priority=BATCH)
+    if reply.startswith("❌"):
+        return {"error": reply, "issue_count": len(shard)}
+    partial = parse_json_reply(reply)
+    if not partial:
+        return {"error": "❌ Reply was not a JSON categorization", "issue_count": len(shard)}
+    partial["issue_count"] = len(shard)
+    return partial
+
+def _entries(partial: dict, key: str) -> list:
+    """Well-formed (dict) entries of one list in a map output; models sometimes return bare strings"""
+    entries = partial.get(key)
+    return [e for e in entries if isinstance(e, dict)] if isinstance(entries, list) else []
+
+def _issue_numbers(entry: dict) -> list:
+    """Issue numbers from a map output entry, ignoring malformed values"""
+    numbers = entry.get("issue_numbers")
+    return [n for n in numbers if isinstance(n, (int, str))] if isinstance(numbers, list) else []
+
+def merge_partials(partials: list) -> dict:
+    """Locally merge map outputs: categories and components by name, pain points ranked by size"""
+    categories = {}
+    components = {}
+    pain_points = []
+    for partial in partials:
+        for cat in _entries(partial, "categories"):
+            key = str(cat.get("name", "Other")).strip().lower()
+            merged = categories.setdefault(key, {
+                "name": str(cat.get("name", "Other")).strip(),
+                "issue_numbers": set(),
+                "severity": {"critical": 0, "high": 0, "medium": 0},
+            })
+            merged["issue_numbers"].update(_issue_numbers(cat))
+            severity = cat.get("severity")
+            for level, count in (severity.items() if isinstance(severity, dict) else ()):
+                if isinstance(count, int) and not isinstance(count, bool):
+                    merged["severity"][level] = merged["severity"].get(level, 0) + count
+        for comp in _entries(partial, "components"):
+            key = str(comp.get("name", "")).strip().lower()
+            if key:
+                components.setdefault(key, {"name": str(comp["name"]).strip(), "issue_numbers": set()})
+                components[key]["issue_numbers"].update(_issue_numbers(comp))
+        pain_points.extend(_entries(partial, "pain_points"))
+
+    pain_points.sort(key=lambda p: len(_issue_numbers(p)), reverse=True)
+    return {
+        "categories": sorted(
+            ({"name": c["name"], "count": len(c["issue_numbers"]), "severity": c["severity"]} for c in categories.values()),
+            key=lambda c: c["count"], reverse=True
+        ),
+        "components": sorted(
+            ({"name": c["name"], "count": len(c["issue_numbers"])} for c in components.values()),
+            key=lambda c: c["count"], reverse=True
+        ),
+        "pain_points": [
+            {"problem": p.get("problem", ""), "count": len(_issue_numbers(p)), "why": p.get("why", "")}
+            for p in pain_points[:MAX_REDUCE_PAIN_POINTS]
+        ],
     }
-    
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("output", {}).get("choices", [{}])[0].get("message", {}).get("content", "")
-        else:
-            return f"❌ API Error {response.status_code}"
-    except Exception as e:
-        return f"❌ Exception: {str(e)}"
+
+def analyze_github_issues_map_reduce(api_key: str, model: str = "qwen-max", max_workers: int = 4,
+                                     shard_token_budget: int = MAP_SHARD_TOKEN_BUDGET,
+                                     on_progress=None, filters: dict = None, hedge: HedgePolicy = None) -> str:
+    """
+    Analyze an arbitrarily large issue set hierarchically.
+
+    Issues are sharded into token-bounded batches, a concurrency-limited
+    map pass categorizes each shard, partials are merged locally and a
+    final reduce pass writes the report. on_progress(done, total, message)
+    is called from the calling thread as shards complete.
+    """
+    issues_data, error = load_issues_data(filters=filters)
+    if error:
+        return error
+
+    shards = shard_issues(issues_data, shard_token_budget)
+    total = len(shards)
+    if on_progress:
+        on_progress(0, total, f"Loaded {len(issues_data)} issues into {total} shards")
+
+    partials = []
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(propagate(map_issue_shard), shard, api_key, model) for shard in shards]
+        for done, future in enumerate(as_completed(futures), 1):
+            partial = future.result()
+            if "error" in partial:
+                failed += 1
+            else:
+                partials.append(partial)
+            if on_progress:
+                on_progress(done, total, f"Categorized shard {done}/{total}" + (f" ({failed} failed)" if failed else ""))
+
+    if not partials:
+        return f"❌ All {total} map requests failed"
+
+    merged = merge_partials(partials)
+    analyzed = sum(p["issue_count"] for p in partials)
+    if on_progress:
+        on_progress(total, total, "Merging partial categorizations...")
+
+    prompt = f"""You are an AI agent analyzing GitHub issues for the LangChain repository.
+
+**YOUR TASK:**
+{analyzed} GitHub issues were categorized in {len(partials)} batches. Below are the merged
+partial results (category counts, severity totals, most-affected components and the
+largest pain points with how many issues mention each). Write the final report from them.
+
+**MERGED PARTIAL RESULTS** (minified JSON):
+```
+{json.dumps(merged, separators=(",", ":"), ensure_ascii=False)}
+```
+
+Similar categories from different batches may have slightly different names - merge them
+and add up their counts.
+
+**ANALYSIS REQUIREMENTS:**
+
+{ANALYSIS_REQUIREMENTS}"""
+
+    messages = [
+        {"role": "system", "content": ANALYST_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    return call_qwen(messages, api_key, model, compute_max_tokens(model, prompt_tokens), hedge=hedge)
+
+def analyze_github_issues_incremental(api_key: str, model: str = "qwen-max",
+                                      token_budget: int = DEFAULT_ISSUE_TOKEN_BUDGET, max_workers: int = 4,
+                                      on_progress=None, filters: dict = None, hedge: HedgePolicy = None) -> str:
+    """
+    Analyze only issues that are new or changed since the last run.
+
+    The previous per-category summaries are sent along with the delta and
+    the model returns the updated report plus updated summaries, which are
+    persisted with the new watermark. Cost grows with the delta, not the
+    backlog.
+    """
+    store, error = find_issue_store()
+    if error:
+        return error
+    issues_data = store.query(**(filters or {}))
+    if not issues_data:
+        return "❌ No issues match the selected filters."
+
+    state_path = state_path_for(store.source, filters)
+    state = load_state(state_path)
+    new, updated = find_delta(issues_data, state)
+    delta = new + updated
+    if on_progress:
+        on_progress(0, 2, f"{len(new)} new and {len(updated)} updated issues since #{state.watermark_number}")
+
+    if not delta and state.report:
+        return f"> ♻️ No new or updated issues since the last run (watermark #{state.watermark_number}).\n\n" + state.report
+
+    # Send the delta directly when it fits the budget, otherwise pre-categorize it with a map pass
+    delta_text, payload_stats = build_issue_payload(delta, token_budget)
+    delta_description = format_description(payload_stats)
+    if payload_stats["issues_dropped"]:
+        shards = shard_issues(delta)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            partials = [p for p in executor.map(lambda sh: map_issue_shard(sh, api_key, model), shards) if "error" not in p]
+        if not partials:
+            return "❌ All map requests for the new issues failed"
+        delta_text = json.dumps(merge_partials(partials), separators=(",", ":"), ensure_ascii=False)
+        delta_description = f"minified JSON of partial categorizations from {len(partials)} batches"
+    if on_progress:
+        sent = delta_description if payload_stats["issues_dropped"] else describe_savings(payload_stats)
+        on_progress(1, 2, f"Updating category summaries ({sent})...")
+
+    previous = json.dumps(state.category_summaries, separators=(",", ":"), ensure_ascii=False) if state.category_summaries else "[] (first run)"
+    prompt = f"""You are an AI agent maintaining a running analysis of GitHub issues for the LangChain repository.
+
+**PREVIOUS CATEGORY SUMMARIES** (covering {state.issues_analyzed} issues up to #{state.watermark_number}):
+```json
+{previous}
+```
+
+**NEW / UPDATED ISSUES** ({len(new)} new, {len(updated)} updated; {delta_description}):
+```
+{delta_text}
+```
+
+**YOUR TASK:**
+Update the category summaries with these issues - add new issues to the counts of the
+categories they belong to, create categories where needed, and revise summaries. Updated
+issues were already counted before, so only move them if their category changed. Then
+write the full report covering ALL {len(issues_data)} issues.
+
+**ANALYSIS REQUIREMENTS:**
+
+{ANALYSIS_REQUIREMENTS}
+
+Finish your reply with the updated summaries as a single fenced block, exactly:
+```json
+{{"categories": [{{"name": "...", "count": 0, "severity": {{"critical": 0, "high": 0, "medium": 0}}, "summary": "2-3 sentences on the main pain points"}}]}}
+```"""
+
+    messages = [
+        {"role": "system", "content": ANALYST_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    reply = call_qwen(messages, api_key, model, compute_max_tokens(model, prompt_tokens), hedge=hedge)
+    if reply.startswith("❌"):
+        return reply
+
+    report, summaries = split_report_and_summaries(reply)
+    if summaries:
+        # Only advance the watermark once the model returned usable summaries
+        save_state(advance_state(state, delta, summaries, report), state_path)
+    if on_progress:
+        on_progress(2, 2, f"Saved summaries for {len(summaries)} categories")
+    return report
+
+def describe_run(mode: str, filters: dict) -> str:
+    """Short history label for an analysis run: mode plus the active filters"""
+    parts = [mode]
+    if filters.get("state"):
+        parts.append(filters["state"])
+    if filters.get("labels"):
+        parts.append(", ".join(filters["labels"]))
+    if filters.get("since_days"):
+        parts.append(f"last {filters['since_days']} days")
+    return " · ".join(parts)
+
+def load_history_entry(entry):
+    """Show a past analysis with its stage timings"""
+    st.session_state.agent_result = entry.result
+    st.session_state.agent_timings = entry.timings.get("table")
+    st.session_state.agent_trace = None
 
 def main():
     # Header
@@ -241,11 +655,11 @@ def main():
         st.info("""
         **Agent Mode**
         
-        This demo simulates agent behavior:
-        - GitHub API calls
-        - Multi-step reasoning
-        - Pattern recognition
-        - Solution proposals
+        The agent runs a real pipeline:
+        - Load & filter indexed issues
+        - Local pre-processing
+        - Multi-step reasoning with Qwen
+        - Per-stage timing report
         """)
         
         # API Key
@@ -281,6 +695,92 @@ def main():
             help="qwen-max recommended for complex analysis"
         )
         
+        token_budget = st.slider(
+            "🪙 Issue data token budget",
+            min_value=1000,
+            max_value=20000,
+            value=DEFAULT_ISSUE_TOKEN_BUDGET,
+            step=500,
+            help="Issues are compacted (minified JSON, tables, truncated bodies) to fit this budget"
+        )
+        
+        precluster_mode = st.checkbox(
+            "🧮 Pre-cluster issues locally",
+            value=True,
+            help="Group similar issues with TF-IDF + k-means on your CPU and send only cluster summaries"
+        )
+        
+        dedupe_mode = st.checkbox(
+            "🧬 Collapse near-duplicates",
+            value=True,
+            help="Single-shot analysis: group near-duplicates with MinHash + LSH and send one representative "
+                 "per group with its duplicate count"
+        )
+        
+        incremental_mode = st.checkbox(
+            "📈 Incremental (new/updated issues only)",
+            value=False,
+            help="Send only issues that changed since the last run, plus the saved per-category summaries"
+        )
+        
+        map_reduce_mode = st.checkbox(
+            "🗺️ Map-reduce over all issues",
+            value=False,
+            help="Shard the full issue set into token-bounded batches, categorize them in parallel, then merge"
+        )
+        map_workers = st.slider(
+            "⚡ Parallel map requests",
+            min_value=1,
+            max_value=8,
+            value=4,
+            disabled=not (map_reduce_mode or incremental_mode)
+        )
+        
+        hedge_mode = st.checkbox(
+            "🏎️ Hedge slow requests",
+            value=False,
+            help="If no token arrives within the p95 first-token latency, race a backup request and keep the first to finish"
+        )
+        hedge_fallback = st.selectbox(
+            "Hedge with",
+            ["qwen-turbo", "qwen-plus", "same model"],
+            disabled=not hedge_mode
+        )
+        hedge_policy = HedgePolicy(
+            fallback_model=None if hedge_fallback == "same model" else hedge_fallback
+        ) if hedge_mode else None
+        
+        trace_mode = st.checkbox(
+            "🧪 Trace requests",
+            value=False,
+            help="Record timed spans for each phase (prompt, network, generation, parsing, rendering)"
+        )
+        
+        show_rate_limiter_panel()
+        
+        st.divider()
+        
+        # Issue filters - served from the memory-mapped index
+        st.subheader("🔎 Issue Filters")
+        store, store_error = find_issue_store()
+        state_filter = st.selectbox("State", ["all"] + (store.states if store else []))
+        label_filter = st.multiselect(
+            "Labels (any of)",
+            sorted(store.labels) if store else [],
+        )
+        since_days = st.number_input("Created in the last N days (0 = all)", min_value=0, value=0, step=7)
+        filters = {
+            "state": None if state_filter == "all" else state_filter,
+            "labels": label_filter or None,
+            "since_days": since_days or None,
+        }
+        if store:
+            st.caption(f"📇 {len(store.filter(**filters))} of {len(store)} indexed issues match")
+        
+        st.divider()
+        
+        show_history_sidebar("agent", load_history_entry, placeholder="e.g. memory leak")
+        
         st.divider()
         
         st.markdown("""
@@ -323,47 +823,136 @@ def main():
             st.error("⚠️ Enter API key first!")
         elif not st.session_state.api_tested:
             st.warning("⚠️ Test API connection first!")
+        elif store is None:
+            st.error(store_error)
         else:
             st.subheader("🤖 Agent Working...")
             
-            steps_container = st.container()
+            st.session_state.agent_trace = None
             
-            with steps_container:
-                # Simulate agent steps
-                simulate_agent_step("Connecting to GitHub API...", 0.8)
-                simulate_agent_step("Fetching issues from langchain-ai/langchain...", 1.2)
-                simulate_agent_step("Retrieved 50 issues", 0.5)
-                simulate_agent_step("Parsing issue content...", 1.0)
-                simulate_agent_step("Analyzing patterns and clustering similar problems...", 1.5)
-                simulate_agent_step("Cross-referencing with LangChain documentation...", 1.0)
-                
-                # Status message
-                status = st.empty()
-                status.info("🧠 Generating comprehensive analysis with Qwen-Max...")
+            # The analysis input is the export version plus the filters applied to it
+            analysis_input = json.dumps({
+                "export": store.source.name,
+                "signature": source_signature(store.source),
+                "filters": filters,
+                "matching_issues": len(store.filter(**filters)),
+            }, sort_keys=True)
+            
+            def record_analysis(mode, result, timings, duration_s):
+                get_history().record(
+                    "agent", model, analysis_input, result,
+                    describe_run(mode, filters),
+                    params={
+                        "mode": mode, "token_budget": token_budget, "precluster": precluster_mode,
+                        "dedupe": dedupe_mode, "map_workers": map_workers, "filters": filters,
+                        "hedge": hedge_policy.fallback_model or model if hedge_policy else None,
+                    },
+                    timings=timings, duration_s=duration_s
+                )
             
-            # Get real Qwen analysis
-            try:
-                result = analyze_github_issues(st.session_state.api_key, model)
+            with trace("analyze_github_issues", enabled=trace_mode) as tracer:
+                steps_container = st.container()
+            
+                if map_reduce_mode or incremental_mode:
+                    st.session_state.agent_timings = None
+                    with steps_container:
+                        progress_bar = st.progress(0.0)
+                        status = st.empty()
+                        status.info("📥 Loading issues...")
                 
-                if result.startswith("❌"):
-                    status.error(result)
-                else:
-                    status.empty()
-                    steps_container.empty()
-                    
-                    st.success("✅ Agent task completed!")
-                    st.session_state.agent_result = result
+                    def report_progress(done, total, message):
+                        progress_bar.progress(done / total if total else 1.0)
+                        status.info(f"🔄 {message}")
+                
+                    try:
+                        started = time.monotonic()
+                        if map_reduce_mode:
+                            mode = "Map-reduce"
+                            result = analyze_github_issues_map_reduce(
+                                st.session_state.api_key, model, max_workers=map_workers, on_progress=report_progress,
+                                filters=filters, hedge=hedge_policy
+                            )
+                        else:
+                            mode = "Incremental"
+                            result = analyze_github_issues_incremental(
+                                st.session_state.api_key, model, token_budget, max_workers=map_workers,
+                                on_progress=report_progress, filters=filters, hedge=hedge_policy
+                            )
                     
-                    st.divider()
-                    st.subheader("📊 Analysis Results")
-                    st.markdown(result)
+                        if result.startswith("❌"):
+                            status.error(result)
+                        else:
+                            steps_container.empty()
+                        
+                            st.success("✅ Agent task completed!")
+                            st.session_state.agent_result = result
+                            elapsed = time.monotonic() - started
+                            record_analysis(mode, result, {"total_s": round(elapsed, 2)}, elapsed)
+                        
+                            st.divider()
+                            st.subheader("📊 Analysis Results")
+                            with span("render", chars=len(result)):
+                                st.markdown(result)
+                
+                    except Exception as e:
+                        status.error(f"❌ Error: {str(e)}")
+            
+                else:
+                    with steps_container:
+                        stages = build_analysis_pipeline(
+                            store, st.session_state.api_key, model, token_budget, precluster_mode, filters, hedge_policy,
+                            dedupe_mode
+                        )
+                        placeholders = {stage.name: st.empty() for stage in stages}
+                        for stage in stages:
+                            placeholders[stage.name].caption(f"⏸️ {stage.label}")
+                
+                    def show_stage(result):
+                        placeholder = placeholders[result.name]
+                        if result.status == "running":
+                            placeholder.info(f"🔄 {result.label}...")
+                        elif result.status == "done":
+                            placeholder.success(f"✅ {result.label} - {result.detail} ({result.duration:.2f}s)")
+                        elif result.status == "failed":
+                            placeholder.error(f"❌ {result.label} ({result.duration:.2f}s)")
+                        else:
+                            placeholder.warning(f"⏭️ {result.label} - skipped")
+                
+                    run = run_pipeline(stages, on_update=show_stage)
+                    st.session_state.agent_timings = run.timing_table()
+                
+                    if run.ok:
+                        st.success(f"✅ Agent task completed in {run.wall_time:.1f}s!")
+                        st.session_state.agent_result = run.value("parse")
+                        stage_times = {name: round(r.duration, 3) for name, r in run.results.items()}
+                        record_analysis(
+                            "Single-shot", st.session_state.agent_result,
+                            dict(stage_times, table=st.session_state.agent_timings), run.wall_time
+                        )
                     
-            except Exception as e:
-                status.error(f"❌ Error: {str(e)}")
+                        st.divider()
+                        st.subheader("📊 Analysis Results")
+                        with span("render", chars=len(st.session_state.agent_result)):
+                            st.markdown(st.session_state.agent_result)
+                    else:
+                        st.error(run.error())
+                
+                    with st.expander("⏱️ Stage timings", expanded=not run.ok):
+                        st.markdown(st.session_state.agent_timings)
+            
+            if tracer:
+                st.session_state.agent_trace = {"table": tracer.summary_table(), "json": tracer.dumps()}
+                show_trace_panel(st.session_state.agent_trace, TRACE_FILE_NAME, expanded=True)
     
     elif st.session_state.agent_result:
         st.subheader("📊 Analysis Results")
         st.markdown(st.session_state.agent_result)
+        
+        if st.session_state.agent_timings:
+            with st.expander("⏱️ Stage timings"):
+                st.markdown(st.session_state.agent_timings)
+        if st.session_state.agent_trace:
+            show_trace_panel(st.session_state.agent_trace, TRACE_FILE_NAME)
     
     else:
         st.info("👆 Click **Run Agent** to start the analysis")
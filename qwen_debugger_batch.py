@@ -0,0 +1,283 @@
+"""
+Qwen Code Debugger - headless batch mode
+Walks a directory tree and analyzes every Python file with bounded
+concurrency, writing per-file Markdown and JSON reports. Files whose
+content (and model) haven't changed since the last run are skipped, so
+an interrupted run resumes where it stopped.
+
+Usage:
+    export DASHSCOPE_API_KEY=sk-...
+    python qwen_debugger_batch.py path/to/repo --out qwen_reports --workers 8
+
+Throughput is bounded by the shared rate limiter, not just --workers: by
+default at most 8 requests per model are in flight (qwen-max: 600 RPM,
+1M TPM). At ~15-20 s per review that is roughly 25-30 files a minute, so
+raise the cap to match your Model Studio quota for large trees:
+    python qwen_debugger_batch.py path/to/repo --workers 32 --max-concurrency 32 --rpm 1200
+(the same limits can be set for every model with DASHSCOPE_RATE_LIMITS,
+e.g. '{"qwen-max": {"rpm": 1200, "tpm": 2000000, "max_concurrency": 32}}')
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+from pathlib import Path
+
+from dashscope_client import BATCH, ModelLimits, get_scheduler
+from code_analysis import CHUNKING_THRESHOLD_LINES, analyze_code, analyze_code_chunked
+from static_checks import run_static_checks, format_findings
+
+DEFAULT_EXCLUDES = {
+    ".git", ".hg", ".svn", "__pycache__", ".venv", "venv", "env", "node_modules",
+    "build", "dist", "site-packages", ".tox", ".nox", ".mypy_cache", ".pytest_cache",
+}
+MANIFEST_NAME = "manifest.json"
+
+
+class Manifest:
+    """
+    Per-file record of completed analyses.
+
+    Each finished file is appended as one line to a JSONL log, so recording
+    stays O(1) per file; compact() folds the log into the JSON snapshot at
+    the end of a run. Loading replays the log over the snapshot, so an
+    interrupted run loses nothing that was recorded.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.log_path = path.with_suffix(".log.jsonl")
+        self._lock = threading.Lock()
+        try:
+            self.entries = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+        try:
+            with self.log_path.open(encoding="utf-8") as log:
+                for line in log:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a killed run
+                    self.entries[record["file"]] = record
+        except OSError:
+            pass
+        self._log = None
+
+    def is_done(self, rel_path: str, digest: str, model: str, out_dir: Path) -> bool:
+        entry = self.entries.get(rel_path)
+        return (
+            entry is not None
+            and entry.get("status") == "ok"
+            and entry.get("sha256") == digest
+            and entry.get("model") == model
+            and (out_dir / entry.get("report", "")).is_file()
+        )
+
+    def record(self, rel_path: str, entry: dict):
+        with self._lock:
+            self.entries[rel_path] = entry
+            if self._log is None:
+                self._log = self.log_path.open("a", encoding="utf-8")
+            self._log.write(json.dumps(dict(entry, file=rel_path), sort_keys=True) + "\n")
+            self._log.flush()
+
+    def compact(self):
+        """Write every entry to the JSON snapshot atomically and drop the log"""
+        with self._lock:
+            tmp = self.path.with_suffix(f".tmp-{os.getpid()}")
+            tmp.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+            os.replace(tmp, self.path)
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            self.log_path.unlink(missing_ok=True)
+
+
+def find_python_files(root: Path, excludes=DEFAULT_EXCLUDES) -> list:
+    """All .py files under root, skipping virtualenvs, caches and VCS directories"""
+    if root.is_file():
+        return [root]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in excludes and not d.endswith(".egg-info"))
+        files.extend(Path(dirpath) / name for name in sorted(filenames) if name.endswith(".py"))
+    return files
+
+
+def analyze_file(path: Path, rel_path: str, digest: str, code: str, args, out_dir: Path) -> dict:
+    """Analyze one file and write its Markdown and JSON reports"""
+    started = time.monotonic()
+    lines = len(code.splitlines())
+    findings = run_static_checks(code) if code.strip() else []
+    if not code.strip():
+        report, mode = "_Empty file - nothing to analyze._", "skipped"
+    elif lines > args.chunk_threshold:
+        mode = "chunked"
+        report = analyze_code_chunked(
+            code, args.api_key, args.model, max_workers=args.chunk_workers, priority=BATCH, findings=findings
+        )
+    else:
+        mode = "single"
+        report = analyze_code(code, args.api_key, args.model, priority=BATCH, findings=findings)
+    status = "error" if report.startswith("❌") else "ok"
+
+    report_base = out_dir / rel_path
+    report_base.parent.mkdir(parents=True, exist_ok=True)
+    md_path = report_base.with_name(report_base.name + ".md")
+    json_path = report_base.with_name(report_base.name + ".json")
+    entry = {
+        "file": rel_path,
+        "sha256": digest,
+        "model": args.model,
+        "lines": lines,
+        "mode": mode,
+        "status": status,
+        "static_findings": len(findings),
+        "duration_s": round(time.monotonic() - started, 2),
+        "analyzed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "report": str(md_path.relative_to(out_dir)),
+    }
+    if status == "ok":
+        static_section = f"## 🧹 Static Checks\n\n{format_findings(findings)}\n\n" if findings else ""
+        md_path.write_text(f"# 🔍 Qwen Analysis: `{rel_path}`\n\n{static_section}{report}\n", encoding="utf-8")
+    json_path.write_text(
+        json.dumps(dict(entry, findings=[asdict(f) for f in findings], analysis=report), indent=2), encoding="utf-8"
+    )
+    return entry
+
+
+def write_index(manifest: Manifest, out_dir: Path):
+    """Top-level Markdown index linking every per-file report"""
+    rows = [
+        "# 🔍 Qwen Batch Analysis", "",
+        "| File | Status | Lines | Static findings | Mode | Time (s) |", "|---|---|---|---|---|---|"
+    ]
+    for rel_path, entry in sorted(manifest.entries.items()):
+        status = "✅" if entry["status"] == "ok" else "❌"
+        link = f"[{rel_path}]({entry['report']})" if entry["status"] == "ok" else rel_path
+        rows.append(
+            f"| {link} | {status} | {entry['lines']} | {entry.get('static_findings', '-')} | "
+            f"{entry['mode']} | {entry['duration_s']} |"
+        )
+    (out_dir / "index.md").write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze every Python file in a directory tree with Qwen")
+    parser.add_argument("path", type=Path, help="Directory (or single file) to analyze")
+    parser.add_argument("--out", type=Path, default=Path("qwen_reports"), help="Report directory (default: qwen_reports)")
+    parser.add_argument("--model", default="qwen-turbo", choices=["qwen-turbo", "qwen-plus", "qwen-max"])
+    parser.add_argument("--workers", type=int, default=8, help="Files analyzed concurrently (default: 8)")
+    parser.add_argument("--chunk-workers", type=int, default=4, help="Parallel requests per large file (default: 4)")
+    parser.add_argument("--chunk-threshold", type=int, default=CHUNKING_THRESHOLD_LINES,
+                        help=f"Split files longer than this many lines (default: {CHUNKING_THRESHOLD_LINES})")
+    parser.add_argument("--max-concurrency", type=int,
+                        help="Requests in flight at once for --model (default: rate limiter setting, 8)")
+    parser.add_argument("--rpm", type=int, help="Requests per minute allowed for --model")
+    parser.add_argument("--tpm", type=int, help="Tokens per minute allowed for --model")
+    parser.add_argument("--force", action="store_true", help="Re-analyze files even if unchanged")
+    parser.add_argument("--exclude", action="append", default=[], help="Extra directory names to skip")
+    parser.add_argument("--api-key", default=os.environ.get("DASHSCOPE_API_KEY", ""),
+                        help="Model Studio API key (default: $DASHSCOPE_API_KEY)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.api_key:
+        print("❌ No API key - pass --api-key or set DASHSCOPE_API_KEY", file=sys.stderr)
+        return 2
+
+    scheduler = get_scheduler()
+    limits = scheduler.limits(args.model)
+    if args.max_concurrency or args.rpm or args.tpm:
+        limits = ModelLimits(
+            rpm=args.rpm or limits.rpm,
+            tpm=args.tpm or limits.tpm,
+            max_concurrency=args.max_concurrency or limits.max_concurrency,
+        )
+        scheduler.set_limits(args.model, limits)
+    print(f"⏱️ {args.model}: {limits.max_concurrency} concurrent requests, {limits.rpm} RPM, {limits.tpm:,} TPM")
+    if args.workers > limits.max_concurrency:
+        print(f"⚠️ --workers {args.workers} exceeds the {limits.max_concurrency}-request cap; "
+              f"pass --max-concurrency to use them")
+
+    root = args.path.resolve()
+    out_dir = args.out.resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(out_dir / MANIFEST_NAME)
+    base = root if root.is_dir() else root.parent
+
+    # Decide what needs work before submitting anything
+    pending = []
+    files = find_python_files(root, DEFAULT_EXCLUDES | set(args.exclude))
+    for path in files:
+        if out_dir in path.resolve().parents:
+            continue
+        rel_path = path.relative_to(base).as_posix()
+        code = path.read_text(encoding="utf-8", errors="replace")
+        digest = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        if args.force or not manifest.is_done(rel_path, digest, args.model, out_dir):
+            pending.append((path, rel_path, digest, code))
+
+    skipped = len(files) - len(pending)
+    print(f"🔍 {len(files)} Python files found, {skipped} unchanged since last run, {len(pending)} to analyze")
+
+    started = time.monotonic()
+    failed = finished = 0
+    futures = {}
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futures = {
+            executor.submit(analyze_file, path, rel_path, digest, code, args, out_dir): rel_path
+            for path, rel_path, digest, code in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            finished = done
+            rel_path = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(pending)}] ❌ {rel_path}: {e}")
+                continue
+            manifest.record(rel_path, entry)
+            if entry["status"] != "ok":
+                failed += 1
+            icon = "✅" if entry["status"] == "ok" else "❌"
+            print(f"[{done}/{len(pending)}] {icon} {rel_path} ({entry['mode']}, {entry['duration_s']}s)")
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        in_flight = sum(1 for future in futures if future.running())
+        manifest.compact()
+        write_index(manifest, out_dir)
+        print(f"\n⏸️ Interrupted - {finished}/{len(pending)} files finished and saved, {in_flight} in-flight "
+              f"analyses abandoned; re-run the same command to resume.")
+        sys.stdout.flush()
+        # Worker threads are blocked in HTTP calls and the interpreter joins
+        # executor threads at exit, so leave without waiting for them
+        os._exit(130)
+    executor.shutdown()
+
+    manifest.compact()
+    write_index(manifest, out_dir)
+    elapsed = time.monotonic() - started
+    print(f"🎉 Done in {elapsed:.1f}s - {len(pending) - failed} analyzed, {failed} failed, {skipped} skipped")
+    print(f"📄 Reports: {out_dir / 'index.md'}")
+    for model_name, model_stats in scheduler.stats().items():
+        batch_delay = model_stats["queue_delay"].get("batch")
+        if batch_delay:
+            print(f"⏱️ {model_name}: {model_stats['throttled']} throttled, "
+                  f"queue delay p50 {batch_delay['p50']:.2f}s / p95 {batch_delay['p95']:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,13 @@ import streamlit as st
 import requests
 import time
 
+from tracing import span, trace
+from ui_panels import get_history, show_history_sidebar, show_rate_limiter_panel, show_trace_panel
+from static_checks import run_static_checks
+from code_analysis import (
+    CHUNKING_THRESHOLD_LINES, analyze_code, analyze_code_chunked, analyze_code_incremental
+)
+
 # Page config
 st.set_page_config(
     page_title="Qwen Code Debugger",
@@ -68,6 +75,12 @@ if 'analysis_result' not in st.session_state:
     st.session_state.analysis_result = None
 if 'api_tested' not in st.session_state:
     st.session_state.api_tested = False
+if 'chunk_cache' not in st.session_state:
+    st.session_state.chunk_cache = {}
+if 'cache_stats' not in st.session_state:
+    st.session_state.cache_stats = None
+if 'analysis_trace' not in st.session_state:
+    st.session_state.analysis_trace = None
 
 def test_api_key(api_key: str) -> tuple:
     """Test Model Studio API key using direct HTTP request (international)"""
@@ -109,68 +122,34 @@ def test_api_key(api_key: str) -> tuple:
     except Exception as e:
         return False, f"❌ Network/Request Error: {str(e)}"
 
-def analyze_code(code: str, api_key: str, model: str = "qwen-turbo") -> str:
-    """Analyze code using Model Studio API (international, non-streaming)"""
-    
-    prompt = f"""You are an expert Python developer and code reviewer.
-Analyze the following code and provide:
-
-1. **Problems Identified**: List all issues (circular imports, inefficiency, bad practices)
-2. **Explanations**: Clearly explain each issue
-3. **Refactored Code**: Provide clean, efficient, production-ready code
-4. **Best Practices Applied**: Highlight improvements made
-
-Code to analyze:
-```python
-{code}
-```
+def code_title(code: str) -> str:
+    """Short history label: line count plus the first definition (or first line) of the code"""
+    lines = [line.strip() for line in code.splitlines() if line.strip()]
+    first = next((line for line in lines if line.startswith(("def ", "class ", "async def "))), lines[0] if lines else "")
+    return f"{len(code.splitlines())} lines - {first[:50]}"
 
-Provide your analysis in a clear, structured format with markdown formatting."""
-
-    messages = [
-        {"role": "system", "content": "You are an expert Python code reviewer and refactoring specialist."},
-        {"role": "user", "content": prompt}
-    ]
-
-    # ✅ CORRECT INTERNATIONAL ENDPOINT
-    url = "https://dashscope-intl.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "User-Agent": "Qwen-Code-Debugger/1.0"
-    }
+def load_history_entry(entry):
+    """Show a past analysis and put its code back in the editor"""
+    st.session_state.analysis_result = entry.result
+    st.session_state.example_code = entry.input_text
+    st.session_state.cache_stats = None
+    st.session_state.analysis_trace = None
 
+TRACE_FILE_NAME = "qwen_debugger_trace.json"
+SEVERITY_ICONS = {"high": "🔴", "medium": "🟠", "low": "🟡"}
 
-    payload = {
-        "model": model,  # e.g., "qwen-turbo"
-        "input": {
-            "messages": messages
-        },
-        "parameters": {
-            "result_format": "message",
-            "max_tokens": 3000,
-            "temperature": 0.3
-        }
-    }
-
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=90)
-        if response.status_code == 200:
-            data = response.json()
-            content = data.get("output", {}).get("choices", [{}])[0].get("message", {}).get("content", "")
-            return content
-        else:
-            try:
-                error_detail = response.json()
-                msg = error_detail.get("message", "Unknown error")
-                code_err = error_detail.get("code", "N/A")
-                return f"❌ API Error {response.status_code} [{code_err}]: {msg}"
-            except:
-                return f"❌ API Error {response.status_code}: {response.text}"
-            
-    except Exception as e:
-        return f"❌ Exception: {str(e)}"
+def show_static_checks(findings: list, elapsed_ms: float):
+    """Instant, model-free findings for the code currently in the editor"""
+    title = f"🧹 Static checks - {len(findings)} finding{'s' if len(findings) != 1 else ''} ({elapsed_ms:.0f} ms)"
+    with st.expander(title, expanded=bool(findings)):
+        if not findings:
+            st.caption("No circular or lazy imports, mutable defaults, SQL formatting, unclosed files or N+1 loops found")
+        for finding in findings:
+            st.markdown(
+                f"{SEVERITY_ICONS.get(finding.severity, '⚪')} **{finding.location}** `{finding.rule}` - {finding.message}"
+            )
+        if findings:
+            st.caption("These are sent with the code so Qwen can focus on refactoring")
 
 def main():
     # Header
@@ -229,6 +208,35 @@ def main():
             help="turbo: Fast | plus: Balanced | max: Best Quality"
         )
         
+        chunked_mode = st.checkbox(
+            "🧩 Chunked analysis for large files",
+            value=True,
+            help=f"Files over {CHUNKING_THRESHOLD_LINES} lines are split by class/function and analyzed in parallel"
+        )
+        incremental_mode = st.checkbox(
+            "♻️ Incremental re-analysis",
+            value=False,
+            help=f"For files over {CHUNKING_THRESHOLD_LINES} lines, analyze function-by-function and reuse "
+                 "cached results for functions that haven't changed"
+        )
+        max_workers = st.slider(
+            "⚡ Parallel requests",
+            min_value=1,
+            max_value=8,
+            value=4,
+            disabled=not (chunked_mode or incremental_mode)
+        )
+        
+        trace_mode = st.checkbox(
+            "🧪 Trace requests",
+            value=False,
+            help="Record timed spans for each phase (prompt, network, generation, parsing, rendering)"
+        )
+        
+        show_rate_limiter_panel()
+        
+        show_history_sidebar("debugger", load_history_entry, placeholder="e.g. mutable default")
+        
         st.divider()
         
         # Example code
@@ -339,12 +347,21 @@ def find_user(db,name):
                     "qwen_analysis.md",
                     use_container_width=True
                 )
+        
+        findings = None
+        if code_input.strip():
+            started = time.perf_counter()
+            findings = run_static_checks(code_input)
+            show_static_checks(findings, (time.perf_counter() - started) * 1000)
     
     with col2:
         st.subheader("✨ AI Analysis")
         
         if clear_button:
             st.session_state.analysis_result = None
+            st.session_state.chunk_cache = {}
+            st.session_state.cache_stats = None
+            st.session_state.analysis_trace = None
             st.session_state.example_code = ""
             st.rerun()
         
@@ -359,23 +376,66 @@ def find_user(db,name):
                 status_text = st.empty()
                 status_text.text("🔄 Analyzing your code with Qwen AI...")
                 
-                try:
-                    full_response = analyze_code(code_input, st.session_state.api_key, model)
+                st.session_state.analysis_trace = None
+                with trace("analyze_code", enabled=trace_mode) as tracer:
+                    try:
+                        st.session_state.cache_stats = None
+                        started = time.monotonic()
+                        large_file = len(code_input.splitlines()) > CHUNKING_THRESHOLD_LINES
+                        if incremental_mode and large_file:
+                            mode = "incremental"
+                            status_text.text("♻️ Analyzing new and changed functions with Qwen AI...")
+                            full_response, st.session_state.cache_stats = analyze_code_incremental(
+                                code_input, st.session_state.api_key, model,
+                                st.session_state.chunk_cache, max_workers=max_workers, findings=findings
+                            )
+                        elif chunked_mode and large_file:
+                            mode = "chunked"
+                            status_text.text("🧩 Large file detected - analyzing sections in parallel...")
+                            full_response = analyze_code_chunked(
+                                code_input, st.session_state.api_key, model, max_workers=max_workers,
+                                findings=findings
+                            )
+                        else:
+                            mode = "single"
+                            full_response = analyze_code(
+                                code_input, st.session_state.api_key, model, findings=findings
+                            )
+                        elapsed = time.monotonic() - started
                     
-                    if full_response.startswith("❌"):
-                        st.error(full_response)
-                    else:
-                        st.session_state.analysis_result = full_response
-                        st.markdown(full_response)
-                        st.success("🎉 Code analysis completed successfully!")
+                        if full_response.startswith("❌"):
+                            st.error(full_response)
+                        else:
+                            st.session_state.analysis_result = full_response
+                            stats = st.session_state.cache_stats
+                            get_history().record(
+                                "debugger", model, code_input, full_response, code_title(code_input),
+                                params={"mode": mode, "max_workers": max_workers, "static_findings": len(findings)},
+                                timings=dict(stats or {}, total_s=round(elapsed, 2)),
+                                duration_s=elapsed
+                            )
+                            if stats:
+                                st.info(
+                                    f"♻️ {stats['cached_sections']}/{stats['sections']} sections "
+                                    f"({stats['cached_line_ratio']:.0%} of lines) served from cache"
+                                )
+                            with span("render", chars=len(full_response)):
+                                st.markdown(full_response)
+                            st.success("🎉 Code analysis completed successfully!")
                         
-                except Exception as e:
-                    st.error(f"❌ Unexpected error: {str(e)}")
-                finally:
-                    status_text.empty()
+                    except Exception as e:
+                        st.error(f"❌ Unexpected error: {str(e)}")
+                    finally:
+                        status_text.empty()
+                
+                if tracer:
+                    st.session_state.analysis_trace = {"table": tracer.summary_table(), "json": tracer.dumps()}
+                    show_trace_panel(st.session_state.analysis_trace, TRACE_FILE_NAME, expanded=True)
         
         elif st.session_state.analysis_result:
             st.markdown(st.session_state.analysis_result)
+            if st.session_state.analysis_trace:
+                show_trace_panel(st.session_state.analysis_trace, TRACE_FILE_NAME)
         else:
             st.info("👈 Paste your code on the left and click **Analyze Code**")
             
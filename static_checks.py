@@ -0,0 +1,288 @@
+"""
+Static Checks - deterministic AST rules run before the Qwen code review
+Flags the problems the debugger is most often asked about (local imports
+hiding circular dependencies, mutable default arguments, SQL built with
+string formatting, open() outside a with block, per-item queries in
+loops) in milliseconds. The rules are heuristics, so the model is asked to
+verify each finding rather than take it as given
+"""
+
+import ast
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+# A statement must start the string and name its table ("{}" stands in for f-string values)
+_SQL_NAME = r"[\w.*{}%\"`\[\]]+"
+_SQL_COLUMN = rf"{_SQL_NAME}(?:\([^)]*\))?(?:\s+as\s+\w+)?"
+SQL_PATTERN = re.compile(
+    rf"^\s*(?:select\s+(?:distinct\s+)?{_SQL_COLUMN}(?:\s*,\s*{_SQL_COLUMN})*\s+from\s+{_SQL_NAME}"
+    rf"|insert\s+(?:or\s+\w+\s+)?into\s+{_SQL_NAME}"
+    rf"|update\s+{_SQL_NAME}\s+set\b"
+    rf"|delete\s+from\s+{_SQL_NAME})",
+    re.IGNORECASE,
+)
+MUTABLE_FACTORIES = {"list", "dict", "set", "defaultdict", "OrderedDict", "Counter", "deque"}
+
+# Calls that usually mean a round trip (database, HTTP) when made once per loop item
+QUERY_METHODS = {"execute", "executemany", "fetchone", "fetchall", "urlopen"}
+# Generic names that only mean a query when called on something that looks like a database handle
+DB_QUERY_METHODS = {"query", "find", "find_one"}
+DB_RECEIVER = re.compile(r"(?:^|_)(db|database|session|cursor|cur|conn|connection|collection|client|engine)$")
+HTTP_CLIENTS = {"requests", "httpx", "session", "client", "http"}
+HTTP_METHODS = {"get", "post", "put", "patch", "delete", "request"}
+LOOKUP_FUNCTION = re.compile(r"^(get|fetch|load|query|find|select|lookup|retrieve|read)_\w+")
+
+SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+@dataclass
+class Finding:
+    """One rule violation, with the 1-based line range it covers"""
+    rule: str
+    severity: str
+    line: int
+    end_line: int
+    message: str
+
+    @property
+    def location(self) -> str:
+        return f"L{self.line}" if self.end_line == self.line else f"L{self.line}-{self.end_line}"
+
+
+def _finding(rule: str, severity: str, node: ast.AST, message: str) -> Finding:
+    return Finding(rule, severity, node.lineno, getattr(node, "end_lineno", None) or node.lineno, message)
+
+
+def _parents(tree: ast.AST) -> Dict[ast.AST, ast.AST]:
+    parents = {}
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+    return parents
+
+
+def _enclosing_function(node: ast.AST, parents: Dict) -> Optional[ast.AST]:
+    while node in parents:
+        node = parents[node]
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return node
+    return None
+
+
+def _call_name(call: ast.Call) -> str:
+    func = call.func
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return ""
+
+
+def _receiver_name(call: ast.Call) -> str:
+    func = call.func
+    if isinstance(func, ast.Attribute):
+        value = func.value
+        if isinstance(value, ast.Name):
+            return value.id
+        if isinstance(value, ast.Attribute):
+            return value.attr
+    return ""
+
+
+def _names(node: ast.AST) -> set:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+# Rules ---------------------------------------------------------------------
+
+def _local_imports(tree: ast.Module, parents: Dict) -> Iterator[tuple]:
+    """(import node, enclosing function, imported names, circular reason or "") for imports inside functions"""
+    defined_here = {
+        node.name for node in tree.body if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue
+        function = _enclosing_function(node, parents)
+        if function is None:
+            continue
+        names = [alias.asname or alias.name for alias in node.names]
+        shadowed = sorted(set(names) & defined_here)
+        if shadowed:
+            reason = f"{', '.join(shadowed)} is also defined in this file"
+        elif isinstance(node, ast.ImportFrom) and node.level:
+            reason = "it imports from a sibling module"
+        else:
+            reason = ""
+        yield node, function, names, reason
+
+
+def check_circular_imports(tree: ast.Module, parents: Dict) -> Iterator[Finding]:
+    """Imports inside functions that point back into this package - the usual circular-import workaround"""
+    for node, function, names, reason in _local_imports(tree, parents):
+        if reason:
+            yield _finding(
+                "circular-import", "medium", node,
+                f"Import of {', '.join(names)} inside `{function.name}()` likely hides a circular import - "
+                f"{reason}"
+            )
+
+
+def check_lazy_imports(tree: ast.Module, parents: Dict) -> Iterator[Finding]:
+    """Other imports inside functions - often deliberate (optional dependency, startup time)"""
+    for node, function, names, reason in _local_imports(tree, parents):
+        if not reason:
+            yield _finding(
+                "lazy-import", "low", node,
+                f"Import of {', '.join(names)} inside `{function.name}()` - move it to module level "
+                "unless it is deferred on purpose (optional dependency, import cost)"
+            )
+
+
+def check_mutable_defaults(tree: ast.Module, parents: Dict) -> Iterator[Finding]:
+    """List/dict/set defaults are shared between calls"""
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            continue
+        args = node.args
+        positional = args.posonlyargs + args.args
+        pairs = list(zip(positional[len(positional) - len(args.defaults):], args.defaults))
+        pairs += [(arg, default) for arg, default in zip(args.kwonlyargs, args.kw_defaults) if default is not None]
+        for arg, default in pairs:
+            literal = (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp)
+            mutable = isinstance(default, literal) or (
+                isinstance(default, ast.Call) and _call_name(default) in MUTABLE_FACTORIES
+            )
+            if mutable:
+                name = getattr(node, "name", "lambda")
+                yield _finding(
+                    "mutable-default", "high", default,
+                    f"Mutable default for `{arg.arg}` in `{name}()` is created once and shared by every call - "
+                    "default to None and create it inside the function"
+                )
+
+
+def _sql_text(node: ast.AST) -> str:
+    if isinstance(node, ast.JoinedStr):
+        return "".join(
+            v.value if isinstance(v, ast.Constant) and isinstance(v.value, str) else "{}" for v in node.values
+        )
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return ""
+
+
+def check_sql_formatting(tree: ast.Module, parents: Dict) -> Iterator[Finding]:
+    """SQL assembled with f-strings, % or .format() instead of bound parameters"""
+    for node in ast.walk(tree):
+        how = None
+        if isinstance(node, ast.JoinedStr) and any(isinstance(v, ast.FormattedValue) for v in node.values):
+            how, text = "an f-string", _sql_text(node)
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mod):
+            how, text = "% formatting", _sql_text(node.left)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "format":
+            how, text = "str.format()", _sql_text(node.func.value)
+        if how and SQL_PATTERN.search(text):
+            yield _finding(
+                "sql-injection", "high", node,
+                f"SQL built with {how} - values are interpolated unescaped; use parameterized queries"
+            )
+
+
+def check_unclosed_files(tree: ast.Module, parents: Dict) -> Iterator[Finding]:
+    """open() outside a with block leaks the handle if anything raises before close()"""
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "open"):
+            continue
+        parent = parents.get(node)
+        if isinstance(parent, ast.withitem) and parent.context_expr is node:
+            continue
+        yield _finding(
+            "unclosed-file", "medium", node,
+            "open() outside a `with` block - the file stays open if an exception occurs before close()"
+        )
+
+
+def _loops(tree: ast.Module) -> Iterator[tuple]:
+    """(loop line, loop variables, nodes evaluated once per iteration) for every loop and comprehension"""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.For, ast.AsyncFor)):
+            yield node.lineno, _names(node.target), node.body
+        elif isinstance(node, ast.While):
+            yield node.lineno, set(), node.body
+        elif isinstance(node, (ast.ListComp, ast.SetComp, ast.GeneratorExp, ast.DictComp)):
+            targets = set().union(*(_names(g.target) for g in node.generators))
+            elements = [node.key, node.value] if isinstance(node, ast.DictComp) else [node.elt]
+            yield node.lineno, targets, elements + [cond for g in node.generators for cond in g.ifs]
+
+
+def check_n_plus_one(tree: ast.Module, parents: Dict) -> Iterator[Finding]:
+    """A query, HTTP request or per-item lookup inside a loop instead of one batched call"""
+    reported = set()
+    # Innermost loops first, so each call is attributed to the loop that repeats it most directly
+    for loop_line, targets, body in reversed(list(_loops(tree))):
+        for statement in body:
+            for node in ast.walk(statement):
+                if not isinstance(node, ast.Call) or node in reported:
+                    continue
+                name, receiver = _call_name(node), _receiver_name(node)
+                if (
+                    name in QUERY_METHODS
+                    or (name in DB_QUERY_METHODS and DB_RECEIVER.search(receiver.lower()))
+                    or (name in HTTP_METHODS and receiver.lower() in HTTP_CLIENTS)
+                ):
+                    kind, severity = "query/request", "medium"
+                elif LOOKUP_FUNCTION.match(name) and targets & set().union(
+                    *(_names(arg) for arg in node.args), *(_names(kw.value) for kw in node.keywords)
+                ):
+                    kind, severity = "lookup", "low"
+                else:
+                    continue
+                reported.add(node)
+                yield _finding(
+                    "n-plus-one", severity, node,
+                    f"`{name}()` {kind} runs once per iteration of the loop at line {loop_line} - "
+                    "fetch everything in one batched call before the loop"
+                )
+
+
+RULES: Dict[str, Callable[[ast.Module, Dict], Iterator[Finding]]] = {
+    "circular-import": check_circular_imports,
+    "lazy-import": check_lazy_imports,
+    "mutable-default": check_mutable_defaults,
+    "sql-injection": check_sql_formatting,
+    "unclosed-file": check_unclosed_files,
+    "n-plus-one": check_n_plus_one,
+}
+
+
+def run_static_checks(code: str, rules: Optional[List[str]] = None) -> List[Finding]:
+    """
+    Run the AST rules over code and return findings sorted by line.
+
+    Code that doesn't parse yields a single syntax-error finding.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        line = e.lineno or 1
+        return [Finding("syntax-error", "high", line, line, f"Code does not parse: {e.msg}")]
+
+    parents = _parents(tree)
+    findings = []
+    for rule_id, check in RULES.items():
+        if rules is None or rule_id in rules:
+            findings.extend(check(tree, parents))
+    findings.sort(key=lambda f: (f.line, SEVERITY_ORDER.get(f.severity, 3), f.rule))
+    return findings
+
+
+def findings_in_range(findings: List[Finding], start_line: int, end_line: int) -> List[Finding]:
+    """Findings that start within [start_line, end_line] (e.g. one chunk of a file)"""
+    return [f for f in findings if start_line <= f.line <= end_line]
+
+
+def format_findings(findings: List[Finding]) -> str:
+    """One Markdown bullet per finding, for the prompt and the batch reports"""
+    return "\n".join(f"- {f.location} [{f.rule}] {f.message}" for f in findings)
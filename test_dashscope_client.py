@@ -0,0 +1,71 @@
+"""
+Regression tests for dashscope_client hedging, run against a local mock
+DashScope server (python -m unittest test_dashscope_client)
+"""
+
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dashscope_client
+from dashscope_client import HedgePolicy, hedged_chat_completion
+
+PRIMARY_STALL_SECONDS = 10.0
+
+
+class _MockDashScope(BaseHTTPRequestHandler):
+    """Streams one SSE event; qwen-max stalls before its first byte of body, other models reply at once"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        if payload["model"] == "qwen-max":
+            time.sleep(PRIMARY_STALL_SECONDS)
+        event = {"output": {"choices": [{"message": {"content": f"reply from {payload['model']}"}}]},
+                 "usage": {"total_tokens": 10}}
+        data = f"data:{json.dumps(event)}\n\n".encode("utf-8")
+        try:
+            self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+        except OSError:
+            pass  # the client hung up on a cancelled request
+
+    def log_message(self, *args):
+        pass
+
+
+class HedgedChatCompletionTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _MockDashScope)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.original_url = dashscope_client.DASHSCOPE_URL
+        dashscope_client.DASHSCOPE_URL = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def tearDown(self):
+        dashscope_client.DASHSCOPE_URL = self.original_url
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_hedge_reply_is_not_held_back_by_stalled_primary(self):
+        policy = HedgePolicy(fallback_model="qwen-turbo", initial_delay=0.5, max_hedge_rate=1.0)
+        started = time.monotonic()
+        reply, served_by = hedged_chat_completion(
+            [{"role": "user", "content": "hi"}], "sk-test", "qwen-max", timeout=30, policy=policy
+        )
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(reply, "reply from qwen-turbo")
+        self.assertEqual(served_by, "qwen-turbo (hedge)")
+        self.assertLess(elapsed, 3.0, f"hedged reply took {elapsed:.2f}s behind a stalled primary")
+
+
+if __name__ == "__main__":
+    unittest.main()
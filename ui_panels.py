@@ -0,0 +1,97 @@
+"""
+UI Panels - Streamlit sidebar and result panels shared by both Qwen apps
+Rate limiter stats, the span trace breakdown and the searchable analysis
+history look the same in the code debugger and the agent demo
+"""
+
+from typing import Callable
+
+import streamlit as st
+
+from analysis_history import AnalysisHistory, HistoryEntry, PAGE_SIZE
+from dashscope_client import get_scheduler, hedge_stats
+
+
+@st.cache_resource
+def get_history() -> AnalysisHistory:
+    """Open the analysis history database - once per process"""
+    return AnalysisHistory()
+
+
+def show_rate_limiter_panel():
+    """Per-model request counts, limits and queue delays (plus hedging once any request was hedged)"""
+    with st.expander("⏱️ Rate Limiter"):
+        limiter_stats = get_scheduler().stats()
+        if not limiter_stats:
+            st.caption("No requests sent yet")
+        for model_name, model_stats in limiter_stats.items():
+            limits = model_stats["limits"]
+            st.markdown(
+                f"**{model_name}** - {model_stats['requests']} sent, {model_stats['throttled']} throttled, "
+                f"{model_stats['in_flight']} in flight, {model_stats['waiting']} waiting  \n"
+                f"Limits: {limits['rpm']} RPM / {limits['tpm']:,} TPM / {limits['max_concurrency']} concurrent"
+            )
+            for lane, delay in model_stats["queue_delay"].items():
+                st.caption(
+                    f"{lane} queue delay: p50 {delay['p50']:.2f}s · p95 {delay['p95']:.2f}s · "
+                    f"max {delay['max']:.2f}s ({delay['samples']} samples)"
+                )
+        hedging = hedge_stats()
+        if hedging["requests"]:
+            st.caption(
+                f"🏎️ Hedged {hedging['hedged']}/{hedging['requests']} requests ({hedging['hedge_rate']:.0%}), "
+                f"hedge won {hedging['hedge_wins']} ({hedging['hedge_win_rate']:.0%}), "
+                f"{hedging['budget_denied']} denied by budget"
+            )
+
+
+def show_trace_panel(trace_data: dict, file_name: str, expanded: bool = False):
+    """Collapsible span breakdown with a Chrome trace-event download"""
+    with st.expander("🧪 Trace", expanded=expanded):
+        st.markdown(trace_data["table"])
+        st.download_button(
+            "⬇️ Download Chrome trace",
+            trace_data["json"],
+            file_name,
+            mime="application/json",
+            help="Open in chrome://tracing or ui.perfetto.dev"
+        )
+
+
+def show_history_sidebar(app: str, on_load: Callable[[HistoryEntry], None], placeholder: str = ""):
+    """
+    Searchable, paginated list of an app's past analyses; only the current page is read from disk.
+
+    Clicking an entry reads the full record, passes it to on_load (which
+    puts it into the app's session state) and reruns the script.
+    """
+    if 'history_page' not in st.session_state:
+        st.session_state.history_page = 0
+    history = get_history()
+    with st.expander("🗂️ History"):
+        query = st.text_input("Search past analyses", placeholder=placeholder, key="history_query")
+        if query != st.session_state.get("history_last_query", ""):
+            st.session_state.history_last_query = query
+            st.session_state.history_page = 0
+
+        total = history.count(query, app=app)
+        pages = max(1, -(-total // PAGE_SIZE))
+        page = min(st.session_state.history_page, pages - 1)
+        if not total:
+            st.caption("No matching analyses yet" if query else "Completed analyses appear here")
+        for entry in history.search(query, app=app, limit=PAGE_SIZE, offset=page * PAGE_SIZE):
+            if st.button(entry.label, key=f"history_{entry.id}", use_container_width=True):
+                on_load(history.get(entry.id))
+                st.rerun()
+            if entry.snippet:
+                st.caption(entry.snippet)
+
+        if pages > 1:
+            col_prev, col_page, col_next = st.columns([1, 2, 1])
+            if col_prev.button("◀", disabled=page == 0, key="history_prev"):
+                st.session_state.history_page = page - 1
+                st.rerun()
+            col_page.caption(f"Page {page + 1} of {pages} ({total} analyses)")
+            if col_next.button("▶", disabled=page >= pages - 1, key="history_next"):
+                st.session_state.history_page = page + 1
+                st.rerun()